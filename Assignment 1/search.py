@@ -17,6 +17,11 @@ In search.py, you will implement generic search algorithms which are called by
 Pacman agents (in searchAgents.py).
 """
 
+import heapq
+import json
+import time
+import weakref
+from collections import OrderedDict
 import util
 
 class SearchProblem:
@@ -72,7 +77,125 @@ def tinyMazeSearch(problem):
     w = Directions.WEST
     return  [s, s, w, s, w, w, s, w]
 
-def depthFirstSearch(problem):
+class SearchStats:
+    """
+    What one search run did.  Every search function in this file takes an
+    optional stats argument and fills these in:
+
+      expanded       states whose successors were generated
+      generated      successors returned by problem.getSuccessors
+      maxFringe      largest number of entries in the fringe at once
+      closed         states in the closed set (or node table) at the end
+      duplicates     fringe entries skipped or popped for nothing because
+                     their state was already closed or reached more cheaply
+      heuristicTime  seconds spent inside the heuristic
+      successorTime  seconds spent inside problem.getSuccessors
+      totalTime      seconds for the whole search
+      pathLength     number of actions returned
+
+    Anytime searches also set suboptimality, the proven bound on the cost of
+    the returned path divided by the optimal cost (None for the others).
+    """
+    FIELDS = ('expanded', 'generated', 'maxFringe', 'closed', 'duplicates',
+              'heuristicTime', 'successorTime', 'totalTime', 'pathLength')
+
+    def __init__(self, timed=True):
+        for field in self.FIELDS: setattr(self, field, 0)
+        self.suboptimality = None
+        self.timed = timed # False: only the cheap counters kept by the algorithms themselves
+        self._start = time.time()
+
+    def finish(self, actions, closed):
+        "Records the end of the search and returns its actions."
+        self.closed = closed
+        self.pathLength = len(actions)
+        self.totalTime = time.time() - self._start
+        return actions
+
+    def asDict(self):
+        values = dict([(field, getattr(self, field)) for field in self.FIELDS])
+        if self.suboptimality is not None: values['suboptimality'] = self.suboptimality
+        return values
+
+    def writeJson(self, path, **info):
+        "Appends the stats, plus any extra info (layout, algorithm, ...), to a JSON lines file."
+        record = dict(info)
+        record.update(self.asDict())
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def __str__(self):
+        text = ('expanded %(expanded)d, generated %(generated)d, max fringe %(maxFringe)d, closed %(closed)d, '
+                'duplicates %(duplicates)d, heuristic %(heuristicTime).3fs, successors %(successorTime).3fs, '
+                'total %(totalTime).3fs' % self.asDict())
+        if self.suboptimality is not None: text += ', within %.3f of optimal' % self.suboptimality
+        return text
+
+def _instrument(problem, stats, heuristic=None):
+    """
+    Starts a search run and returns (stats, getSuccessors, heuristic).
+
+    When the caller passed a SearchStats, the returned functions count and
+    time every call into it.  Otherwise a private untimed SearchStats is used
+    and the problem's own functions are returned unchanged.
+    """
+    if stats is None: return SearchStats(timed=False), problem.getSuccessors, heuristic
+    stats._start = time.time()
+    if not stats.timed: return stats, problem.getSuccessors, heuristic
+
+    clock = time.perf_counter
+    def getSuccessors(state):
+        start = clock()
+        successors = problem.getSuccessors(state)
+        stats.successorTime += clock() - start
+        stats.expanded += 1
+        stats.generated += len(successors)
+        return successors
+
+    def timedHeuristic(state, problem):
+        start = clock()
+        h = heuristic(state, problem)
+        stats.heuristicTime += clock() - start
+        return h
+
+    return stats, getSuccessors, timedHeuristic if heuristic is not None else None
+
+class SearchNodeArena:
+    """
+    A shared store of search nodes for the graph searches below.
+
+    Each node is an integer id into parallel lists of states, parent ids,
+    actions and path costs.  The fringe only holds these ids, so pushing a
+    successor costs O(1) instead of copying the whole path from the start;
+    the action list is rebuilt once, by following parent links, when the
+    goal is reached.
+    """
+
+    def __init__(self):
+        self.states = []
+        self.parents = []
+        self.actions = []
+        self.costs = []
+
+    def add(self, state, parent=-1, action=None, cost=0):
+        "Stores a new node and returns its id.  The root has parent -1."
+        self.states.append(state)
+        self.parents.append(parent)
+        self.actions.append(action)
+        self.costs.append(cost)
+        return len(self.states) - 1
+
+    def path(self, node):
+        "Returns the list of actions from the root to the given node."
+        actions = []
+        parents, nodeActions = self.parents, self.actions
+        while parents[node] != -1:
+            actions.append(nodeActions[node])
+            node = parents[node]
+        actions.reverse()
+        return actions
+
+def depthFirstSearch(problem, stats=None):
     """
     Search the deepest nodes in the search tree first.
 
@@ -88,82 +211,94 @@ def depthFirstSearch(problem):
     """
     "*** YOUR CODE HERE ***"
 
-    start_point = problem.getStartState() #starting point of problem
+    stats, getSuccessors, _ = _instrument(problem, stats) #counters for SearchStats
+    nodes = SearchNodeArena() #every node is saved once here : (state, parent node, action from parent)
     fringe = util.Stack() #fringe : stack in DFS
-    fringe.push((start_point, [])) #In fringe, we will save (state, [list of cumulated directions])
+    fringe.push(nodes.add(problem.getStartState())) #In fringe, we will save only the id of each node
 
     visited = set() #closed set for visited points
 
     while(not fringe.isEmpty()):    
 
-        curr = fringe.pop() #curr is current searching state
+        curr = fringe.pop() #curr is current searching node
+        state = nodes.states[curr]
 
-        if(problem.isGoalState(curr[0])): #if current state is the goal state
-            return curr[1]  #return the list of cumulated directions 
+        if(problem.isGoalState(state)): #if current state is the goal state
+            return stats.finish(nodes.path(curr), len(visited))  #rebuild the list of directions by following parent links
 
-        if(curr[0] not in visited): #if current point is not visited yet
-            visited.add(curr[0]) #add to closed set
-            succ = problem.getSuccessors(curr[0]) #successors of current point
+        if(state not in visited): #if current point is not visited yet
+            visited.add(state) #add to closed set
+            succ = getSuccessors(state) #successors of current point
             for s in succ:
-                fringe.push((s[0], curr[1] + [s[1]])) #push child-node to fringe : (child point, [directions from start to curr] + [direction from curr to child])
+                fringe.push(nodes.add(s[0], curr, s[1])) #push child-node to fringe : (child point, parent node, direction from curr to child)
+            stats.maxFringe = max(stats.maxFringe, len(fringe.list))
+        else: stats.duplicates += 1 #this entry was pushed for nothing
 
-    return []
+    return stats.finish([], len(visited))
 
-def breadthFirstSearch(problem):
+def breadthFirstSearch(problem, stats=None):
     """Search the shallowest nodes in the search tree first."""
     "*** YOUR CODE HERE ***"
 
     #exactly same as DFS, but we will use queue for fringe
 
-    start_point = problem.getStartState()
+    stats, getSuccessors, _ = _instrument(problem, stats)
+    nodes = SearchNodeArena()
     fringe = util.Queue() #fringe : queue in BFS
-    fringe.push((start_point, [])) 
+    fringe.push(nodes.add(problem.getStartState()))
 
     visited = set()
 
     while(not fringe.isEmpty()):    
 
         curr = fringe.pop()
+        state = nodes.states[curr]
 
-        if(problem.isGoalState(curr[0])): 
-            return curr[1]
+        if(problem.isGoalState(state)): 
+            return stats.finish(nodes.path(curr), len(visited))
 
-        if(curr[0] not in visited):
-            visited.add(curr[0])
-            succ = problem.getSuccessors(curr[0])
+        if(state not in visited):
+            visited.add(state)
+            succ = getSuccessors(state)
             for s in succ:
-                fringe.push((s[0], curr[1] + [s[1]]))
+                fringe.push(nodes.add(s[0], curr, s[1]))
+            stats.maxFringe = max(stats.maxFringe, len(fringe.list))
+        else: stats.duplicates += 1
 
-    return []
+    return stats.finish([], len(visited))
 
-def uniformCostSearch(problem):
+def uniformCostSearch(problem, stats=None):
     """Search the node of least total cost first."""
     "*** YOUR CODE HERE ***"
 
     #also simlilar to DFS/BFS, but we will use priority queue for fringe
 
-    start_point = problem.getStartState()
-    pf_ucs = lambda state : state[2] #priority function for fringe : cumulative cost from start to each state
-    fringe = util.PriorityQueueWithFunction(priorityFunction=pf_ucs) #fringe : priority queue for UCS
-    fringe.push((start_point, [], 0)) #In fringe, we will save (state, [list of cumulated directions], cumulative cost from start to the state)
+    stats, getSuccessors, _ = _instrument(problem, stats)
+    nodes = SearchNodeArena()
+    fringe = util.PriorityQueue() #fringe : priority queue for UCS, priority is the cumulative cost from start to each node
+    fringe.push(nodes.add(problem.getStartState()), 0) #In arena, we will save (state, parent node, direction, cumulative cost from start to the state)
 
     visited = set()
 
     while(not fringe.isEmpty()):    
 
         curr = fringe.pop()
+        state = nodes.states[curr]
 
-        if(problem.isGoalState(curr[0])):
-            return curr[1]
+        if(problem.isGoalState(state)):
+            return stats.finish(nodes.path(curr), len(visited))
 
-        if(curr[0] not in visited):
-            visited.add(curr[0])
-            succ = problem.getSuccessors(curr[0])
+        if(state not in visited):
+            visited.add(state)
+            cost = nodes.costs[curr]
+            succ = getSuccessors(state)
             for s in succ:
-                fringe.push((s[0], curr[1] + [s[1]], curr[2]+s[2])) 
-                #push child-node to fringe : (child point, [directions from start to curr] + [direction from curr to child], cumulative cost from start to curr + cost from curr to child)
+                fringe.push(nodes.add(s[0], curr, s[1], cost + s[2]), cost + s[2])
+                #push child-node to fringe : (child point, parent node, direction from curr to child, cumulative cost from start to curr + cost from curr to child)
+            stats.maxFringe = max(stats.maxFringe, len(fringe.heap))
+        else: stats.duplicates += 1
 
-    return []
+    return stats.finish([], len(visited))
 
 def nullHeuristic(state, problem=None):
     """
@@ -172,37 +307,616 @@ def nullHeuristic(state, problem=None):
     """
     return 0
 
-def aStarSearch(problem, heuristic=nullHeuristic):
-    """Search the node that has the lowest combined cost and heuristic first."""
+class MemoizedHeuristic:
+    """
+    Wraps any heuristic(state, problem) with a bounded least-recently-used
+    cache of its values.
+
+    Every problem instance gets its own cache of at most maxEntries states,
+    so values never leak between layouts, and the cache goes away with the
+    problem.  hits and misses count the lookups over all problems.  Searches
+    that see the same state many times (IDA*, SMA*, repeated searches on
+    one problem) then pay for each state once.
+    """
+
+    def __init__(self, heuristic, maxEntries=100000):
+        self.heuristic = heuristic
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self._caches = weakref.WeakKeyDictionary() # problem -> OrderedDict(state -> h), oldest first
+
+    def __call__(self, state, problem=None):
+        cache = self._caches.get(problem) if problem is not None else None
+        if cache is None:
+            cache = OrderedDict()
+            if problem is not None: self._caches[problem] = cache
+        if state in cache:
+            self.hits += 1
+            cache.move_to_end(state)
+            return cache[state]
+        self.misses += 1
+        h = cache[state] = self.heuristic(state, problem)
+        if len(cache) > self.maxEntries: cache.popitem(last=False)
+        return h
+
+def aStarSearch(problem, heuristic=nullHeuristic, stats=None):
+    """
+    Search the node that has the lowest combined cost and heuristic first.
+
+    The heuristic is evaluated once per state and cached, and a successor is
+    only pushed when it improves on the best cost already pushed for its
+    state (and the state is not closed yet).  The pushes skipped this way
+    are counted as stats.duplicates.
+    """
     "*** YOUR CODE HERE ***"
 
-    #exactly same as UCS, but there is a difference between the priority functions
+    #exactly same as UCS, but there is a difference between the priorities
+
+    stats, getSuccessors, heuristic = _instrument(problem, stats, heuristic)
+    nodes = SearchNodeArena()
+    hCache = {} #h(n) of every state we have seen : the heuristic is called only once per state
+    bestCost = {} #best g(n) pushed so far for every state in the fringe (open-set index)
 
     start_point = problem.getStartState()
-    #priority function (f(n)) = cumulative cost from start to each state (g(n)) + heuristic of each state (h(n))
-    pf_aStar = lambda state : state[2] + heuristic(state[0], problem)
-    fringe = util.PriorityQueueWithFunction(priorityFunction=pf_aStar)
-    fringe.push((start_point, [], 0))
+    hCache[start_point] = heuristic(start_point, problem)
+    bestCost[start_point] = 0
+    #priority (f(n)) = cumulative cost from start to each state (g(n)) + heuristic of each state (h(n))
+    fringe = util.PriorityQueue()
+    fringe.push(nodes.add(start_point), hCache[start_point])
 
     visited = set()
 
     while(not fringe.isEmpty()):    
 
         curr = fringe.pop()
+        state = nodes.states[curr]
 
-        if(problem.isGoalState(curr[0])):
-            return curr[1]
+        if(problem.isGoalState(state)):
+            return stats.finish(nodes.path(curr), len(visited))
 
-        if(curr[0] not in visited):
-            visited.add(curr[0])
-            succ = problem.getSuccessors(curr[0])
+        if(state not in visited):
+            visited.add(state)
+            cost = nodes.costs[curr]
+            succ = getSuccessors(state)
             for s in succ:
-                fringe.push((s[0], curr[1] + [s[1]], curr[2]+s[2]))
+                nextCost = cost + s[2]
+                #closed states are never expanded again, and a push that is not cheaper than the best one
+                #already in the fringe would only be popped after it : both are redundant
+                if s[0] in visited or nextCost >= bestCost.get(s[0], float("inf")):
+                    stats.duplicates += 1
+                    continue
+                bestCost[s[0]] = nextCost
+                if s[0] not in hCache: hCache[s[0]] = heuristic(s[0], problem)
+                fringe.push(nodes.add(s[0], curr, s[1], nextCost), nextCost + hCache[s[0]])
+            stats.maxFringe = max(stats.maxFringe, len(fringe.heap))
+
+    return stats.finish([], len(visited))
+
+def iterativeDeepeningAStarSearch(problem, heuristic=nullHeuristic, transpositions=False, stats=None):
+    """
+    Iterative Deepening A*: repeated depth-first searches that only follow
+    nodes with f(n) = g(n) + h(n) within a bound, raising the bound to the
+    smallest f that exceeded it until a goal is found.
+
+    Memory grows with the depth of the path only: states on the current path
+    are skipped to avoid cycles.  With transpositions=True, a state reached
+    again in the same iteration at no smaller cost is also pruned, which
+    trades a table of the states seen for far fewer re-expansions on graphs
+    like the pacman grid.
+    """
+    stats, getSuccessors, heuristic = _instrument(problem, stats, heuristic)
+    start_point = problem.getStartState()
+    if(problem.isGoalState(start_point)): return stats.finish([], 0)
+
+    bound = heuristic(start_point, problem)
+
+    while(bound < float("inf")):
+
+        nextBound = float("inf") #smallest f(n) over the bound : the bound of the next iteration
+        seen = {start_point: 0} #transposition table : smallest g(n) of every state in this iteration
+        states, actions, costs = [start_point], [], [0] #current path
+        onPath = set([start_point])
+        stack = [iter(getSuccessors(start_point))] #successors left to visit at each depth of the path
+
+        while(stack):
+
+            s = next(stack[-1], None)
+            if s is None: #all successors visited : backtrack
+                stack.pop()
+                onPath.discard(states.pop())
+                costs.pop()
+                if actions: actions.pop()
+                continue
+
+            cost = costs[-1] + s[2]
+            if s[0] in onPath:
+                stats.duplicates += 1
+                continue
+            if transpositions:
+                if seen.get(s[0], float("inf")) <= cost:
+                    stats.duplicates += 1
+                    continue
+                seen[s[0]] = cost
+
+            f = cost + heuristic(s[0], problem)
+            if f > bound:
+                nextBound = min(nextBound, f)
+                continue
+
+            if(problem.isGoalState(s[0])):
+                return stats.finish(actions + [s[1]], len(seen) if transpositions else 0)
+
+            states.append(s[0])
+            actions.append(s[1])
+            costs.append(cost)
+            onPath.add(s[0])
+            stack.append(iter(getSuccessors(s[0])))
+            stats.maxFringe = max(stats.maxFringe, len(stack))
+
+        bound = nextBound
+
+    return stats.finish([], 0)
+
+def anytimeRepairingAStarSearch(problem, heuristic=nullHeuristic, timeLimit=1.0, initialWeight=3.0, weightStep=0.5, stats=None):
+    """
+    Anytime Repairing A* (ARA*) with a wall-clock budget of timeLimit seconds.
+
+    The first search uses f(n) = g(n) + w * h(n) with w = initialWeight and
+    quickly finds a path that costs at most w times the optimum.  While time
+    is left, w is lowered by weightStep and the search is repaired instead
+    of restarted: states whose g improved after they were expanded are kept
+    aside and put back into the open list, which is reordered for the new
+    w.  The best path found before the deadline is returned, and its proven
+    suboptimality bound is left in stats.suboptimality (1 means optimal).
+    The first path is always searched to completion, however long it takes.
+    """
+    stats, getSuccessors, heuristic = _instrument(problem, stats, heuristic)
+    deadline = time.time() + timeLimit
+    inf = float("inf")
 
-    return []
+    start_point = problem.getStartState()
+    cost = {start_point: 0} #g(n)
+    parents = {start_point: None} #parents[state] = (parent state, direction from parent)
+    hCache = {start_point: heuristic(start_point, problem)}
+    goal, goalCost = (start_point, 0) if problem.isGoalState(start_point) else (None, inf)
+
+    opened = set([start_point]) #OPEN : states to expand with the current weight
+    inconsistent = set() #INCONS : g improved after expansion, waiting for the next weight
+    closed = set()
+    closedTotal = 0 #states closed in the earlier weight rounds
+    count = 0 #tie-breaker
+
+    def path(state):
+        actions = []
+        while parents[state] is not None:
+            state, action = parents[state]
+            actions.append(action)
+        actions.reverse()
+        return actions
+
+    def bound(weight):
+        #w' = min(w, g(goal) / min over OPEN and INCONS of g(n) + h(n))
+        lower = min([cost[state] + hCache[state] for state in opened | inconsistent] or [inf])
+        if goalCost <= lower: return 1.0
+        if lower <= 0: return weight
+        return max(1.0, min(weight, goalCost / lower))
+
+    weight = initialWeight
+    bestActions, bestCost, bestBound = None, inf, inf
+
+    while True:
+
+        #reorder the open list for the current weight
+        fringe = []
+        for state in opened:
+            count += 1
+            fringe.append((cost[state] + weight * hCache[state], count, state))
+        heapq.heapify(fringe)
+
+        #ImprovePath : expand while some open state could still lead to a cheaper goal
+        while fringe and fringe[0][0] < goalCost:
+            if bestActions is not None and time.time() > deadline: break
+            key, _, state = heapq.heappop(fringe)
+            if state not in opened or key != cost[state] + weight * hCache[state]: continue #stale entry
+            opened.discard(state)
+            closed.add(state)
+
+            for s in getSuccessors(state):
+                nextCost = cost[state] + s[2]
+                if nextCost >= cost.get(s[0], inf):
+                    stats.duplicates += 1
+                    continue
+                cost[s[0]] = nextCost
+                parents[s[0]] = (state, s[1])
+                if s[0] not in hCache: hCache[s[0]] = heuristic(s[0], problem)
+                if nextCost < goalCost and problem.isGoalState(s[0]):
+                    goal, goalCost = s[0], nextCost
+                if s[0] in closed:
+                    inconsistent.add(s[0])
+                else:
+                    opened.add(s[0])
+                    count += 1
+                    heapq.heappush(fringe, (nextCost + weight * hCache[s[0]], count, s[0]))
+            stats.maxFringe = max(stats.maxFringe, len(fringe))
+
+        if goal is None: break #no path at all
+        if goalCost < bestCost: #a cheaper path keeps the bound proven for the previous one
+            bestActions, bestCost = path(goal), goalCost
+        if not fringe or fringe[0][0] >= goalCost: #ImprovePath finished : the bound for this weight holds
+            bestBound = min(bestBound, bound(weight))
+
+        if bestBound <= 1.0 or time.time() > deadline: break
+
+        #publish, then lower the weight and repair the search tree
+        weight = max(1.0, weight - weightStep)
+        opened |= inconsistent
+        inconsistent = set()
+        closedTotal += len(closed)
+        closed = set()
+
+    stats.suboptimality = bestBound if bestActions is not None else None
+    return stats.finish(bestActions or [], closedTotal + len(closed))
+
+class _BoundedNode:
+    """
+    A node of memoryBoundedAStarSearch.  forgotten maps the state of each
+    child that was dropped to stay within the memory budget to its backed-up
+    f; children with an infinite f are not remembered, as they never come back.
+    """
+    __slots__ = ('state', 'parent', 'action', 'g', 'f', 'depth', 'children', 'expanded', 'forgotten', 'alive')
+
+    def __init__(self, state, parent, action, g, f):
+        self.state, self.parent, self.action, self.g, self.f = state, parent, action, g, f
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.children = set()
+        self.expanded = False
+        self.forgotten = {}
+        self.alive = True
+
+    def key(self):
+        "The f value this node stands for in the open list: its own, or that of its forgotten children."
+        if not self.expanded: return self.f
+        return min(self.forgotten.values()) if self.forgotten else float("inf")
+
+def memoryBoundedAStarSearch(problem, heuristic=nullHeuristic, maxNodes=100000, stats=None):
+    """
+    A* that keeps at most maxNodes search nodes in memory (SMA*-style).
+
+    When the budget is exceeded, the leaf with the highest f (the shallowest
+    among ties) is dropped and its f is remembered by its parent.  The parent
+    goes back into the open list with the smallest f it remembers and
+    regenerates those children, with those f values, if the search ever
+    comes back to it.  A node at depth maxNodes - 1 that is not a goal can
+    never be extended within the budget, so its f is infinite and it is not
+    kept.  The result is optimal as long as
+    the budget can hold a cheapest path; otherwise the backed-up f of the root
+    becomes infinite and the search returns [].
+    """
+    stats, getSuccessors, heuristic = _instrument(problem, stats, heuristic)
+    start_point = problem.getStartState()
+    root = _BoundedNode(start_point, None, None, 0, heuristic(start_point, problem))
+    known = {start_point: root} #the cheapest node in memory for each state : duplicate and cycle detection
+    inMemory = 1
+
+    count = 0 #tie-breaker
+    fringe = [(root.f, 0, count, root)] #best first : lowest f, then deepest
+    worst = [] #leaves to drop first : highest f, then shallowest
+
+    def push(node):
+        nonlocal count
+        count += 1
+        heapq.heappush(fringe, (node.key(), -node.depth, count, node))
+        if not node.children and node is not root:
+            heapq.heappush(worst, (-node.key(), node.depth, count, node))
+
+    def drop(node):
+        #forget a leaf and back its f up to its parent
+        node.alive = False
+        if known.get(node.state) is node: del known[node.state]
+        parent = node.parent
+        parent.children.discard(node)
+        if node.key() < float("inf"): parent.forgotten[node.state] = node.key()
+        push(parent)
+
+    while(fringe):
+
+        key, _, _, curr = heapq.heappop(fringe)
+        if not curr.alive or key != curr.key() or key == float("inf"): continue #stale entry
+        if known.get(curr.state) is not curr: #a cheaper path to this state was found since
+            if not curr.children and curr is not root:
+                drop(curr)
+                inMemory -= 1
+            continue
+
+        if not curr.expanded and problem.isGoalState(curr.state):
+            actions = []
+            while curr.parent is not None:
+                actions.append(curr.action)
+                curr = curr.parent
+            actions.reverse()
+            return stats.finish(actions, inMemory)
+
+        #expand, or regenerate the children that were forgotten
+        retry = curr.forgotten if curr.expanded else None
+        curr.expanded = True
+        curr.forgotten = {}
+        depth = curr.depth + 1
+        for s in getSuccessors(curr.state):
+            cost = curr.g + s[2]
+            if retry is not None and s[0] not in retry: continue #in memory, or known to be hopeless
+            if s[0] in known and known[s[0]].g <= cost:
+                stats.duplicates += 1
+                continue
+            if depth >= maxNodes - 1 and (depth >= maxNodes or not problem.isGoalState(s[0])):
+                continue #f = infinity : the budget cannot hold a path through this child
+            f = max(curr.f, cost + heuristic(s[0], problem)) #pathmax
+            if retry is not None: f = max(f, retry[s[0]]) #back to the f it had when dropped
+            child = _BoundedNode(s[0], curr, s[1], cost, f)
+            curr.children.add(child)
+            known[s[0]] = child
+            inMemory += 1
+            push(child)
+
+        if not curr.children and curr is not root: #dead end : nothing new below this node
+            drop(curr)
+            inMemory -= 1
+
+        stats.maxFringe = max(stats.maxFringe, inMemory)
+        while(inMemory > maxNodes and worst):
+            key, _, _, leaf = heapq.heappop(worst)
+            if not leaf.alive or leaf.children or -key != leaf.key(): continue
+            drop(leaf)
+            inMemory -= 1
+
+        if not root.children and not root.forgotten: break #backed-up f of the root is infinite
+
+    return stats.finish([], inMemory)
+
+def _joinBidirectionalPath(forward, backward, meet):
+    """
+    Joins the two halves of a bidirectional search at the state meet.
+
+    forward maps a state to (parent state, action from parent to state) and
+    backward maps a state to (next state toward the goal, action from state
+    to next state); the root of each side maps to None.
+    """
+    actions = []
+    state = meet
+    while forward[state] is not None:
+        state, action = forward[state]
+        actions.append(action)
+    actions.reverse()
+    state = meet
+    while backward[state] is not None:
+        state, action = backward[state]
+        actions.append(action)
+    return actions
+
+def bidirectionalSearch(problem, stats=None):
+    """
+    Breadth-first search from the start state and from problem.goal at the
+    same time, for problems whose goal is a single state.
+
+    The side with the smaller frontier expands one whole layer at a time.
+    When a layer reaches states already seen by the other side, the cheapest
+    meeting point of that layer gives a shortest path.  Each side only has to
+    reach about half of the solution depth, which on branching state spaces
+    is roughly the square root of the states a one-directional BFS expands.
+    Moves must be reversible (the reverse of every action is legal from the
+    successor), as they are on the pacman grid.
+    """
+    from game import Actions
+
+    stats, getSuccessors, _ = _instrument(problem, stats)
+    start_point, goal = problem.getStartState(), problem.goal
+    if start_point == goal: return stats.finish([], 0)
+
+    forward = {start_point: None} #forward[state] = (parent state, direction from parent)
+    backward = {goal: None} #backward[state] = (next state toward the goal, direction to it)
+    forwardDepth, backwardDepth = {start_point: 0}, {goal: 0}
+    forwardLayer, backwardLayer = [start_point], [goal]
+
+    while(forwardLayer and backwardLayer):
+
+        expandForward = len(forwardLayer) <= len(backwardLayer) #expand the smaller frontier
+        layer = forwardLayer if expandForward else backwardLayer
+        parents, depth = (forward, forwardDepth) if expandForward else (backward, backwardDepth)
+        otherDepth = backwardDepth if expandForward else forwardDepth
+
+        nextLayer = []
+        meet, meetLength = None, float("inf")
+        for state in layer:
+            for s in getSuccessors(state):
+                if s[0] in parents:
+                    stats.duplicates += 1
+                    continue
+                if expandForward: parents[s[0]] = (state, s[1])
+                else: parents[s[0]] = (state, Actions.reverseDirection(s[1])) #we walk this edge the other way
+                depth[s[0]] = depth[state] + 1
+                nextLayer.append(s[0])
+                #a meeting point : keep the one that gives the shortest total path in this layer
+                if s[0] in otherDepth and depth[s[0]] + otherDepth[s[0]] < meetLength:
+                    meet, meetLength = s[0], depth[s[0]] + otherDepth[s[0]]
+
+        if meet is not None:
+            return stats.finish(_joinBidirectionalPath(forward, backward, meet), len(forward) + len(backward))
+
+        if expandForward: forwardLayer = nextLayer
+        else: backwardLayer = nextLayer
+        stats.maxFringe = max(stats.maxFringe, len(forwardLayer) + len(backwardLayer))
+
+    return stats.finish([], len(forward) + len(backward))
+
+def bidirectionalAStarSearch(problem, stats=None):
+    """
+    A* from the start state and from problem.goal at the same time, for
+    problems whose goal is a single position on the grid.
+
+    Each side uses the Manhattan distance to the opposite end as its
+    (front-to-end) heuristic, and ties on f go to the deeper state.  The
+    side with the smaller open list is expanded next, and the search stops once the best path found through
+    a meeting state is no longer than the smallest f value in either open
+    list.  Moves must be reversible with the same cost in both directions.
+    """
+    from game import Actions
+
+    stats, getSuccessors, _ = _instrument(problem, stats)
+    start_point, goal = problem.getStartState(), problem.goal
+    if start_point == goal: return stats.finish([], 0)
+
+    ends = {True: goal, False: start_point} #each side searches toward the opposite end
+    parents = {True: {start_point: None}, False: {goal: None}}
+    cost = {True: {start_point: 0}, False: {goal: 0}}
+    visited = {True: set(), False: set()}
+    fringe = {True: [], False: []}
+    #fringe entries are (f, -g, count, state) : among equal f, the deeper state comes first
+    heapq.heappush(fringe[True], (util.manhattanDistance(start_point, goal), 0, 0, start_point))
+    heapq.heappush(fringe[False], (util.manhattanDistance(goal, start_point), 0, 0, goal))
+
+    meet, bestLength = None, float("inf")
+    count = 1 #last tie-breaker : first pushed, first popped
+
+    while(fringe[True] and fringe[False]):
+
+        #no unexpanded state on either side can lead to a shorter path
+        if max(fringe[True][0][0], fringe[False][0][0]) >= bestLength: break
+
+        side = len(fringe[True]) <= len(fringe[False])
+        other = not side
+        curr = heapq.heappop(fringe[side])[3]
+        if curr in visited[side]: continue
+        visited[side].add(curr)
+
+        for s in getSuccessors(curr):
+            nextCost = cost[side][curr] + s[2]
+            if nextCost >= cost[side].get(s[0], float("inf")):
+                stats.duplicates += 1
+                continue
+            cost[side][s[0]] = nextCost
+            parents[side][s[0]] = (curr, s[1] if side else Actions.reverseDirection(s[1]))
+            heapq.heappush(fringe[side], (nextCost + util.manhattanDistance(s[0], ends[side]), -nextCost, count, s[0]))
+            count += 1
+            if s[0] in cost[other] and nextCost + cost[other][s[0]] < bestLength:
+                meet, bestLength = s[0], nextCost + cost[other][s[0]]
+        stats.maxFringe = max(stats.maxFringe, len(fringe[True]) + len(fringe[False]))
+
+    closed = len(visited[True]) + len(visited[False])
+    if meet is None: return stats.finish([], closed)
+    return stats.finish(_joinBidirectionalPath(parents[True], parents[False], meet), closed)
+
+def _jump(walls, x, y, dx, dy, goal):
+    """
+    Moves from (x, y) in the direction (dx, dy) until it reaches a jump point
+    and returns it, or returns None if a wall comes first.
+
+    Moving horizontally, a jump point is the goal or a cell with a forced
+    neighbour (an open cell above or below whose counterpart behind us is a
+    wall).  Moving vertically, it is also any cell from which a horizontal
+    jump finds a jump point.
+    """
+    while True:
+        x, y = x + dx, y + dy
+        if walls[x][y]: return None
+        if (x, y) == goal: return (x, y)
+        if dx != 0:
+            if (not walls[x][y+1] and walls[x-dx][y+1]) or (not walls[x][y-1] and walls[x-dx][y-1]):
+                return (x, y)
+        else:
+            if (not walls[x+1][y] and walls[x+1][y-dy]) or (not walls[x-1][y] and walls[x-1][y-dy]):
+                return (x, y)
+            if _jump(walls, x, y, 1, 0, goal) is not None or _jump(walls, x, y, -1, 0, goal) is not None:
+                return (x, y)
+
+def jumpPointPath(walls, start, goal, stats=None):
+    """
+    Jump Point Search on a 4-connected grid where every move costs 1.
+
+    walls is the wall Grid of the layout (game.py).  Instead of pushing every
+    open neighbour, each expansion jumps in a straight line over the cells
+    that have an equally short path around them, so only the jump points
+    where paths can turn are pushed.  Returns a shortest list of actions from
+    start to goal (the same length A* with the Manhattan heuristic finds).
+    The jumps from each expanded jump point count as its successor time.
+    """
+    from game import Actions
+
+    if stats is None: stats = SearchStats(timed=False)
+    stats._start = time.time()
+    if start == goal: return stats.finish([], 0)
+
+    parents = {start: None} #parents[jump point] = previous jump point
+    cost = {start: 0}
+    visited = set()
+    fringe = [(util.manhattanDistance(start, goal), 0, start)] #(f, -g, jump point)
+    clock = time.perf_counter
+
+    while(fringe):
+
+        curr = heapq.heappop(fringe)[2]
+        if curr == goal: break
+        if curr in visited:
+            stats.duplicates += 1
+            continue
+        visited.add(curr)
+        stats.expanded += 1
+        jumpStart = clock() if stats.timed else 0
+
+        x, y = curr
+        parent = parents[curr]
+        if parent is None: #start : every direction is natural
+            directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+        else:
+            dx, dy = (x > parent[0]) - (x < parent[0]), (y > parent[1]) - (y < parent[1])
+            if dx != 0: directions = [(0, 1), (0, -1), (dx, 0)] #no need to go back the way we came
+            else: directions = [(1, 0), (-1, 0), (0, dy)]
+
+        points = [_jump(walls, x, y, dx, dy, goal) for dx, dy in directions]
+        if stats.timed: stats.successorTime += clock() - jumpStart
+
+        for point in points:
+            if point is None: continue
+            stats.generated += 1
+            nextCost = cost[curr] + abs(point[0] - x) + abs(point[1] - y)
+            if nextCost >= cost.get(point, float("inf")):
+                stats.duplicates += 1
+                continue
+            cost[point] = nextCost
+            parents[point] = curr
+            heapq.heappush(fringe, (nextCost + util.manhattanDistance(point, goal), -nextCost, point))
+        stats.maxFringe = max(stats.maxFringe, len(fringe))
+
+    if goal not in parents: return stats.finish([], len(visited))
+
+    actions = []
+    point = goal
+    while parents[point] is not None: #every jump is a straight line : fill in the cells in between
+        parent = parents[point]
+        dx, dy = (point[0] > parent[0]) - (point[0] < parent[0]), (point[1] > parent[1]) - (point[1] < parent[1])
+        actions += [Actions.vectorToDirection((dx, dy))] * (abs(point[0] - parent[0]) + abs(point[1] - parent[1]))
+        point = parent
+    actions.reverse()
+    return stats.finish(actions, len(visited))
+
+def jumpPointSearch(problem, stats=None):
+    """
+    Jump Point Search for grid problems with a single goal position and unit
+    step costs, such as PositionSearchProblem with the default costFn.  It
+    reads problem.walls directly instead of calling getSuccessors.
+    """
+    if stats is None: stats = SearchStats(timed=False)
+    actions = jumpPointPath(problem.walls, problem.getStartState(), problem.goal, stats)
+    if '_expanded' in dir(problem): problem._expanded += stats.expanded
+    return actions
 
 # Abbreviations
 bfs = breadthFirstSearch
 dfs = depthFirstSearch
 astar = aStarSearch
 ucs = uniformCostSearch
+bibfs = bidirectionalSearch
+biastar = bidirectionalAStarSearch
+jps = jumpPointSearch
+idastar = iterativeDeepeningAStarSearch
+smastar = memoryBoundedAStarSearch
+arastar = anytimeRepairingAStarSearch
@@ -40,6 +40,17 @@ from game import Actions
 import util
 import time
 import search
+import os
+import hashlib
+import mmap
+import tempfile
+import weakref
+import heapq
+import json
+import multiprocessing
+import queue
+from array import array
+from collections import OrderedDict
 
 class GoWestAgent(Agent):
     "An agent that goes West until it can't."
@@ -69,11 +80,17 @@ class SearchAgent(Agent):
       depthFirstSearch or dfs
       breadthFirstSearch or bfs
 
+    Every search reports a search.SearchStats, which is printed after the
+    search.  With statsFile set (-a statsFile=stats.jsonl) it is also
+    appended to that file as one JSON line.
+
+    With heuristicCache set to a number of entries (-a heuristicCache=100000),
+    the heuristic is wrapped in a search.MemoizedHeuristic of that size.
 
     Note: You should NOT change any code in SearchAgent
     """
 
-    def __init__(self, fn='depthFirstSearch', prob='PositionSearchProblem', heuristic='nullHeuristic'):
+    def __init__(self, fn='depthFirstSearch', prob='PositionSearchProblem', heuristic='nullHeuristic', statsFile=None, heuristicCache=0):
         # Warning: some advanced Python magic is employed below to find the right functions and problems
 
         # Get the search function from the name and heuristic
@@ -91,14 +108,20 @@ class SearchAgent(Agent):
             else:
                 raise AttributeError(heuristic + ' is not a function in searchAgents.py or search.py.')
             print('[SearchAgent] using function %s and heuristic %s' % (fn, heuristic))
+            self.memoizedHeuristic = None
+            if int(heuristicCache) > 0:
+                heur = self.memoizedHeuristic = search.MemoizedHeuristic(heur, int(heuristicCache))
+                print('[SearchAgent] caching up to %d heuristic values' % int(heuristicCache))
             # Note: this bit of Python trickery combines the search algorithm and the heuristic
-            self.searchFunction = lambda x: func(x, heuristic=heur)
+            self.searchFunction = lambda x, stats=None: func(x, heuristic=heur, stats=stats)
 
         # Get the search problem type from the name
         if prob not in globals().keys() or not prob.endswith('Problem'):
             raise AttributeError(prob + ' is not a search problem type in SearchAgents.py.')
         self.searchType = globals()[prob]
         print('[SearchAgent] using problem type ' + prob)
+        self.searchName = fn if 'heuristic' not in func.__code__.co_varnames else '%s,%s' % (fn, heuristic)
+        self.statsFile = statsFile
 
     def registerInitialState(self, state):
         """
@@ -112,10 +135,22 @@ class SearchAgent(Agent):
         if self.searchFunction == None: raise Exception("No search function provided for SearchAgent")
         starttime = time.time()
         problem = self.searchType(state) # Makes a new search problem
-        self.actions  = self.searchFunction(problem) # Find a path
+        stats = search.SearchStats()
+        if 'stats' in self.searchFunction.__code__.co_varnames:
+            self.actions  = self.searchFunction(problem, stats=stats) # Find a path
+        else:
+            self.actions  = self.searchFunction(problem) # Find a path
+            stats = None
         totalCost = problem.getCostOfActions(self.actions)
         print('Path found with total cost of %d in %.1f seconds' % (totalCost, time.time() - starttime))
         if '_expanded' in dir(problem): print('Search nodes expanded: %d' % problem._expanded)
+        if getattr(self, 'memoizedHeuristic', None) is not None:
+            print('Heuristic cache: %d hits, %d misses' % (self.memoizedHeuristic.hits, self.memoizedHeuristic.misses))
+        if stats is not None:
+            print('Search stats: %s' % stats)
+            if getattr(self, 'statsFile', None):
+                stats.writeJson(self.statsFile, search=getattr(self, 'searchName', type(self).__name__),
+                                problem=type(problem).__name__, cost=totalCost)
 
     def getAction(self, state):
         """
@@ -133,6 +168,54 @@ class SearchAgent(Agent):
         else:
             return Directions.STOP
 
+class GridAdjacency:
+    """
+    The open cells of a wall layout compiled into a compressed (CSR)
+    adjacency table.
+
+    Cells are numbered column by column (cells[i] is the position of cell i,
+    cellIds the reverse).  The neighbours of cell i are
+    neighbors[offsets[i]:offsets[i+1]], reached with the matching entries
+    of actions, always in the North, South, East, West order the search
+    problems use.  Searches over integer cell ids read these arrays
+    directly; the search problems use successors(), which returns the
+    (position, action) pairs of a cell built together with the table.
+    """
+
+    def __init__(self, walls):
+        self.cells = [(x, y) for x in range(walls.width) for y in range(walls.height) if not walls[x][y]]
+        self.cellIds = dict([(cell, i) for i, cell in enumerate(self.cells)])
+        self.size = len(self.cells)
+        self.offsets = array('i', [0])
+        self.neighbors = array('i')
+        self.actions = []
+        self._successors = {}
+
+        for x, y in self.cells:
+            pairs = []
+            for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
+                dx, dy = Actions.directionToVector(action)
+                nextState = (int(x + dx), int(y + dy))
+                if not walls[nextState[0]][nextState[1]]:
+                    self.neighbors.append(self.cellIds[nextState])
+                    self.actions.append(action)
+                    pairs.append((nextState, action))
+            self.offsets.append(len(self.neighbors))
+            self._successors[(x, y)] = pairs
+
+    def successors(self, position):
+        "Returns the (next position, action) pairs of an open cell.  Do not modify the list."
+        return self._successors[position]
+
+_gridAdjacencies = {} # wall layout key -> GridAdjacency
+
+def getGridAdjacency(walls):
+    "Returns the GridAdjacency of a wall layout, compiling it only once per process."
+    key = wallLayoutKey(walls)
+    if key not in _gridAdjacencies:
+        _gridAdjacencies[key] = GridAdjacency(walls)
+    return _gridAdjacencies[key]
+
 class PositionSearchProblem(search.SearchProblem):
     """
     A search problem defines the state space, start state, goal test, successor
@@ -158,6 +241,8 @@ class PositionSearchProblem(search.SearchProblem):
         self.goal = goal
         self.costFn = costFn
         self.visualize = visualize
+        self.adjacency = getGridAdjacency(self.walls)
+        self._successors = {} # successor triples of every state expanded so far
         if warn and (gameState.getNumFood() != 1 or not gameState.hasFood(*goal)):
             print('Warning: this does not look like a regular search maze')
 
@@ -190,17 +275,16 @@ class PositionSearchProblem(search.SearchProblem):
          successor to the current state, 'action' is the action
          required to get there, and 'stepCost' is the incremental
          cost of expanding to that successor
+
+        The moves come from the precompiled GridAdjacency of the walls, and
+        the triples of a state are built once and then reused, so the
+        returned list must not be modified.
         """
 
-        successors = []
-        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x,y = state
-            dx, dy = Actions.directionToVector(action)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                nextState = (nextx, nexty)
-                cost = self.costFn(nextState)
-                successors.append( ( nextState, action, cost) )
+        successors = self._successors.get(state)
+        if successors is None:
+            successors = [(nextState, action, self.costFn(nextState)) for nextState, action in self.adjacency.successors(state)]
+            self._successors[state] = successors
 
         # Bookkeeping for display purposes
         self._expanded += 1 # DO NOT CHANGE
@@ -250,6 +334,140 @@ class StayWestSearchAgent(SearchAgent):
         costFn = lambda pos: 2 ** pos[0]
         self.searchType = lambda state: PositionSearchProblem(state, costFn)
 
+PORTFOLIO_PREFERENCES = os.path.join(tempfile.gettempdir(), 'pacman-portfolio.json')
+
+# search functions that return an optimal path (bfs only for unit step costs,
+# astar and idastar only with an admissible heuristic)
+OPTIMAL_SEARCHES = ('bfs', 'breadthFirstSearch', 'ucs', 'uniformCostSearch', 'astar', 'aStarSearch',
+                    'idastar', 'iterativeDeepeningAStarSearch', 'bibfs', 'bidirectionalSearch',
+                    'biastar', 'bidirectionalAStarSearch', 'jps', 'jumpPointSearch')
+
+def _portfolioWorker(index, searchFunction, problem, results):
+    "Runs one configuration of a portfolio in its own process and reports back."
+    try:
+        stats = search.SearchStats()
+        actions = searchFunction(problem, stats=stats)
+        results.put((index, actions, stats, None))
+    except Exception as e:
+        results.put((index, None, None, '%s: %s' % (type(e).__name__, e)))
+
+class PortfolioSearchAgent(SearchAgent):
+    """
+    A SearchAgent that races several optimal search configurations on the
+    same problem, each in its own process, keeps the path of the first one
+    to finish and terminates the others.
+
+    portfolio lists the configurations as fn or fn:heuristic joined by '+':
+
+    > python pacman.py -l bigMaze -p PortfolioSearchAgent -a portfolio=bfs+astar:manhattanHeuristic
+
+    Every configuration must be an optimal search (see OPTIMAL_SEARCHES), so
+    the first answer is an optimal one.  The winner of each layout is counted
+    in the JSON file preferenceFile; later runs on the same walls start the
+    configurations in order of past wins, and with workers set below the size
+    of the portfolio only the favourites get a process at first.  Without
+    fork (Windows, spawn-only platforms) the favourite runs alone.
+    """
+    POLL_INTERVAL = 0.1 # seconds between checks for workers that died without reporting
+
+    def __init__(self, portfolio='bfs+ucs+astar:manhattanHeuristic', prob='PositionSearchProblem', workers=0,
+                 preferenceFile=PORTFOLIO_PREFERENCES, statsFile=None):
+        self.configurations = []
+        for config in portfolio.split('+'):
+            fn, heuristic = (config.split(':') + ['nullHeuristic'])[:2]
+            if fn not in OPTIMAL_SEARCHES:
+                raise AttributeError(fn + ' does not always return an optimal path and cannot join a portfolio.')
+            agent = SearchAgent(fn, prob, heuristic)
+            self.configurations.append((config, agent.searchFunction))
+        self.searchType = agent.searchType
+        self.searchName = None
+        self.workers = int(workers) or len(self.configurations)
+        self.preferenceFile = preferenceFile
+        self.statsFile = statsFile
+
+    def preferredOrder(self, key):
+        "Returns the configurations sorted by their past wins on the layout key (ties keep the given order)."
+        wins = self.readPreferences().get(key, {})
+        return sorted(range(len(self.configurations)), key=lambda i: -wins.get(self.configurations[i][0], 0))
+
+    def readPreferences(self):
+        if not self.preferenceFile or not os.path.exists(self.preferenceFile): return {}
+        try:
+            with open(self.preferenceFile) as f:
+                return json.load(f)
+        except ValueError:
+            return {} # a damaged file only loses the preferences
+
+    def recordWinner(self, key, config):
+        "Counts one more win of config on the layout key; the rename makes concurrent writers safe."
+        if not self.preferenceFile: return
+        preferences = self.readPreferences()
+        wins = preferences.setdefault(key, {})
+        wins[config] = wins.get(config, 0) + 1
+        directory = os.path.dirname(self.preferenceFile)
+        if directory and not os.path.isdir(directory): os.makedirs(directory, exist_ok=True)
+        temp = '%s.%d.tmp' % (self.preferenceFile, os.getpid())
+        with open(temp, 'w') as f:
+            json.dump(preferences, f, indent=2, sort_keys=True)
+        os.replace(temp, self.preferenceFile)
+
+    def race(self, problem, order):
+        """
+        Runs the configurations in order, at most self.workers at a time, and
+        returns (index, actions, stats) of the first one that succeeds.  A
+        worker that exits without a result (killed, out of memory, crashed in
+        an extension) counts as a failed configuration.
+        """
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            # the problems hold lambdas and cannot be sent to spawned processes
+            stats = search.SearchStats()
+            return order[0], self.configurations[order[0]][1](problem, stats=stats), stats
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        pending, running, errors = list(order), {}, []
+        try:
+            while pending or running:
+                while pending and len(running) < self.workers:
+                    index = pending.pop(0)
+                    process = context.Process(target=_portfolioWorker,
+                                              args=(index, self.configurations[index][1], problem, results))
+                    process.daemon = True
+                    process.start()
+                    running[index] = process
+                exited = [index for index, process in running.items() if process.exitcode is not None]
+                try:
+                    index, actions, stats, error = results.get(timeout=self.POLL_INTERVAL)
+                except queue.Empty: # a worker flushes its result before it exits, so these never sent one
+                    for index in exited:
+                        process = running.pop(index)
+                        process.join()
+                        errors.append('%s (worker exited with code %s)' % (self.configurations[index][0], process.exitcode))
+                    continue
+                running.pop(index).join()
+                if error is None: return index, actions, stats
+                errors.append('%s (%s)' % (self.configurations[index][0], error))
+        finally:
+            for process in running.values(): # cancel the losers
+                process.terminate()
+                process.join()
+        raise Exception('Every configuration of the portfolio failed: ' + '; '.join(errors))
+
+    def registerInitialState(self, state):
+        starttime = time.time()
+        problem = self.searchType(state) # Makes a new search problem
+        key = '%s:%s' % (type(problem).__name__, wallLayoutKey(state.getWalls()))
+        index, self.actions, stats = self.race(problem, self.preferredOrder(key))
+        self.searchName = self.configurations[index][0]
+        self.recordWinner(key, self.searchName)
+
+        totalCost = problem.getCostOfActions(self.actions)
+        print('[PortfolioSearchAgent] %s finished first' % self.searchName)
+        print('Path found with total cost of %d in %.1f seconds' % (totalCost, time.time() - starttime))
+        print('Search stats: %s' % stats)
+        if self.statsFile:
+            stats.writeJson(self.statsFile, search=self.searchName, problem=type(problem).__name__, cost=totalCost)
+
 def manhattanHeuristic(position, problem, info={}):
     "The Manhattan distance heuristic for a PositionSearchProblem"
     xy1 = position
@@ -262,78 +480,93 @@ def euclideanHeuristic(position, problem, info={}):
     xy2 = problem.goal
     return ( (xy1[0] - xy2[0]) ** 2 + (xy1[1] - xy2[1]) ** 2 ) ** 0.5
 
+class WallRuns:
+    """
+    Prefix counts of the wall runs of a layout, so the number of separate
+    runs of wall along any straight stretch of a row or column costs two
+    array reads instead of a walk.
+
+    A run starts at a wall whose previous cell (West in a row, South in a
+    column) is open or off the board; rowStarts[y][x] counts the runs of
+    row y that start in columns 0..x-1, colStarts[x][y] those of column x
+    that start in rows 0..y-1.
+    """
+
+    def __init__(self, walls):
+        self.width, self.height = walls.width, walls.height
+        self.isWall = [[bool(walls[x][y]) for y in range(self.height)] for x in range(self.width)]
+        self.colStarts = []
+        for x in range(self.width):
+            starts = array('i', [0])
+            for y in range(self.height):
+                starts.append(starts[-1] + (self.isWall[x][y] and (y == 0 or not self.isWall[x][y-1])))
+            self.colStarts.append(starts)
+        self.rowStarts = []
+        for y in range(self.height):
+            starts = array('i', [0])
+            for x in range(self.width):
+                starts.append(starts[-1] + (self.isWall[x][y] and (x == 0 or not self.isWall[x-1][y])))
+            self.rowStarts.append(starts)
+
+    def rowRuns(self, y, x0, x1):
+        "Returns the number of separate wall runs among columns x0..x1 of row y."
+        if x0 > x1: return 0
+        runs = self.rowStarts[y][x1 + 1] - self.rowStarts[y][x0]
+        if x0 > 0 and self.isWall[x0][y] and self.isWall[x0-1][y]: runs += 1 # run that started West of x0
+        return runs
+
+    def colRuns(self, x, y0, y1):
+        "Returns the number of separate wall runs among rows y0..y1 of column x."
+        if y0 > y1: return 0
+        runs = self.colStarts[x][y1 + 1] - self.colStarts[x][y0]
+        if y0 > 0 and self.isWall[x][y0] and self.isWall[x][y0-1]: runs += 1 # run that started South of y0
+        return runs
+
+    def westRuns(self, x, y, steps):
+        """
+        Returns the wall runs met walking steps cells West from (x, y), not
+        counting (x, y) itself.  Like a walk over the Grid, columns below
+        zero wrap around to the East edge.
+        """
+        end = x - steps
+        if end >= 0: return self.rowRuns(y, end, x - 1)
+        runs = self.rowRuns(y, 0, x - 1) + self.rowRuns(y, self.width + end, self.width - 1)
+        if x > 0 and self.isWall[0][y] and self.isWall[self.width-1][y]: runs -= 1 # one run across the wrap
+        return runs
+
+    def verticalRuns(self, x, y, goalY):
+        "Returns the wall runs met walking from (x, y) straight to row goalY, not counting (x, y)."
+        x %= self.width
+        if goalY >= y: return self.colRuns(x, y + 1, goalY)
+        return self.colRuns(x, goalY, y - 1)
+
+_wallRuns = {} # wall layout key -> WallRuns
+
+def getWallRuns(walls):
+    "Returns the WallRuns of a wall layout, computing them only once per process."
+    key = wallLayoutKey(walls)
+    if key not in _wallRuns:
+        _wallRuns[key] = WallRuns(walls)
+    return _wallRuns[key]
+
 def myHeuristic(position, problem, info={}):
     
     xy1 = position
     xy2 = problem.goal
 
-    if (xy1[0] > xy2[0]): we = Directions.WEST
-    else: we = Directions.WEST
-
-    if (xy1[1] > xy2[1]): sn = Directions.SOUTH
-    else: sn = Directions.NORTH
-
-    wall_cnt_1 = 0
-    x, y = position
-    isConsecutiveWall = False
-
-    for h in range(abs(xy1[0] - xy2[0])):
-        dx, dy = Actions.directionToVector(we)
-        nextx, nexty = int(x + dx), int(y + dy)
-
-        if problem.walls[nextx][nexty]: 
-            if not isConsecutiveWall: 
-                wall_cnt_1 += 1
-                isConsecutiveWall = True
-        else: isConsecutiveWall = False
-
-        x, y = nextx, nexty
+    wallRuns = getattr(problem, 'wallRuns', None)
+    if wallRuns is None: wallRuns = problem.wallRuns = getWallRuns(problem.walls) #once per problem
 
-    isConsecutiveWall = False
+    dx = abs(xy1[0] - xy2[0])
+    dy = abs(xy1[1] - xy2[1])
 
-    for v in range(abs(xy1[1] - xy2[1])):
-        dx, dy = Actions.directionToVector(sn)
-        nextx, nexty = int(x + dx), int(y + dy)
-        
-        if problem.walls[nextx][nexty]: 
-            if not isConsecutiveWall: 
-                wall_cnt_1 += 1
-                isConsecutiveWall = True
-        else: isConsecutiveWall = False
+    #route 1 walks dx cells West (West even when the goal is East), then to the goal row
+    wall_cnt_1 = wallRuns.westRuns(xy1[0], xy1[1], dx) + wallRuns.verticalRuns(xy1[0] - dx, xy1[1], xy2[1])
 
-        x, y = nextx, nexty
+    #route 2 walks to the goal row first, then dx cells West
+    wall_cnt_2 = wallRuns.verticalRuns(xy1[0], xy1[1], xy2[1]) + wallRuns.westRuns(xy1[0], xy2[1], dx)
 
-    wall_cnt_2 = 0
-    x, y = position
-    isConsecutiveWall = False
-
-    for v in range(abs(xy1[1] - xy2[1])):
-        dx, dy = Actions.directionToVector(sn)
-        nextx, nexty = int(x + dx), int(y + dy)
-        
-        if problem.walls[nextx][nexty]: 
-            if not isConsecutiveWall: 
-                wall_cnt_2 += 1
-                isConsecutiveWall = True
-        else: isConsecutiveWall = False
-
-        x, y = nextx, nexty
-
-    isConsecutiveWall = False
-
-    for h in range(abs(xy1[0] - xy2[0])):
-        dx, dy = Actions.directionToVector(we)
-        nextx, nexty = int(x + dx), int(y + dy)
-
-        if problem.walls[nextx][nexty]: 
-            if not isConsecutiveWall: 
-                wall_cnt_2 += 1
-                isConsecutiveWall = True
-        else: isConsecutiveWall = False
-
-        x, y = nextx, nexty
-        
-    return abs(xy1[0] - xy2[0]) + abs(xy1[1] - xy2[1]) + min(wall_cnt_1, wall_cnt_2)
+    return dx + dy + min(wall_cnt_1, wall_cnt_2)
 
 
 
@@ -347,6 +580,10 @@ class CornersProblem(search.SearchProblem):
     This search problem finds paths through all four corners of a layout.
 
     You must select a suitable state space and successor function
+
+    A state is a pair ( cellId, visited ) where cellId is Pacman's cell in the
+    GridAdjacency of the walls and visited is a 4-bit mask of the corners
+    reached so far (bit i for self.corners[i]).
     """
 
     def __init__(self, startingGameState):
@@ -364,6 +601,51 @@ class CornersProblem(search.SearchProblem):
         # Please add any code here which you would like to use
         # in initializing the problem
         "*** YOUR CODE HERE ***"
+        self.adjacency = getGridAdjacency(self.walls) # moves of every open cell, compiled once per layout
+        adjacency = self.adjacency
+        self.startId = adjacency.cellIds[self.startingPosition]
+
+        #bit of the corner in every cell (0 for the other cells)
+        self.cornerBits = [0] * adjacency.size
+        for i, corner in enumerate(self.corners):
+            if corner in adjacency.cellIds: self.cornerBits[adjacency.cellIds[corner]] |= 1 << i
+
+        #exact maze distance from every corner to every cell : one BFS per corner
+        inf = float("inf")
+        self.cornerDistances = []
+        for corner in self.corners:
+            distance = [inf] * adjacency.size
+            if corner in adjacency.cellIds:
+                layer, depth = [adjacency.cellIds[corner]], 0
+                distance[layer[0]] = 0
+                while layer:
+                    depth += 1
+                    nextLayer = []
+                    for cell in layer:
+                        for n in adjacency.neighbors[adjacency.offsets[cell]:adjacency.offsets[cell+1]]:
+                            if distance[n] == inf:
+                                distance[n] = depth
+                                nextLayer.append(n)
+                    layer = nextLayer
+            self.cornerDistances.append(distance)
+
+        #tour[i][left] : shortest walk that starts at corner i and visits the corners in the mask left
+        #(a corner that is a wall gets cell 0, its distances are infinite anyway)
+        cornerCells = [adjacency.cellIds.get(corner, 0) for corner in self.corners]
+        tour = [[0] * 16 for i in range(4)]
+        for left in range(1, 16):
+            for i in range(4):
+                tour[i][left] = min([self.cornerDistances[i][cornerCells[j]] + tour[j][left & ~(1 << j)]
+                                     for j in range(4) if left & (1 << j)])
+
+        #heuristicTable[cellId * 16 + visited] : the true remaining cost, over the best order of the corners left
+        self.heuristicTable = []
+        for cell in range(adjacency.size):
+            for visited in range(16):
+                left = 15 & ~visited
+                if left == 0: self.heuristicTable.append(0)
+                else: self.heuristicTable.append(min([self.cornerDistances[i][cell] + tour[i][left & ~(1 << i)]
+                                                      for i in range(4) if left & (1 << i)]))
 
     def getStartState(self):
         """
@@ -371,14 +653,14 @@ class CornersProblem(search.SearchProblem):
         space)
         """
         "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        return (self.startId, self.cornerBits[self.startId])
 
     def isGoalState(self, state):
         """
         Returns whether this search state is a goal state of the problem.
         """
         "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        return state[1] == 15 #all four corners visited
 
     def getSuccessors(self, state):
         """
@@ -392,15 +674,13 @@ class CornersProblem(search.SearchProblem):
         """
 
         successors = []
-        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            # Add a successor state to the successor list if the action is legal
-            # Here's a code snippet for figuring out whether a new position hits a wall:
-            #   x,y = currentPosition
-            #   dx, dy = Actions.directionToVector(action)
-            #   nextx, nexty = int(x + dx), int(y + dy)
-            #   hitsWall = self.walls[nextx][nexty]
-
-            "*** YOUR CODE HERE ***"
+        "*** YOUR CODE HERE ***"
+        #legal moves come straight from the adjacency table : no wall checks needed
+        cell, visited = state
+        adjacency = self.adjacency
+        for edge in range(adjacency.offsets[cell], adjacency.offsets[cell+1]):
+            nextCell = adjacency.neighbors[edge]
+            successors.append( ( (nextCell, visited | self.cornerBits[nextCell]), adjacency.actions[edge], 1) )
 
         self._expanded += 1 # DO NOT CHANGE
         return successors
@@ -436,14 +716,63 @@ def cornersHeuristic(state, problem):
     walls = problem.walls # These are the walls of the maze, as a Grid (game.py)
 
     "*** YOUR CODE HERE ***"
-    return 0 # Default to trivial solution
+    #The cheapest order of the corners left, measured in true maze distances, precomputed by the
+    #problem for every (cell, visited) pair. It is the exact remaining cost, so it is consistent.
+    return problem.heuristicTable[state[0] * 16 + state[1]]
 
 class AStarCornersAgent(SearchAgent):
     "A SearchAgent for FoodSearchProblem using A* and your foodHeuristic"
     def __init__(self):
-        self.searchFunction = lambda prob: search.aStarSearch(prob, cornersHeuristic)
+        self.searchFunction = lambda prob, stats=None: search.aStarSearch(prob, cornersHeuristic, stats)
         self.searchType = CornersProblem
 
+class FoodBits(int):
+    """
+    The remaining food of a FoodSearchProblem state, as an int bitmask.
+
+    Bit i is set while the i-th food of the starting layout is uneaten, so
+    eating a dot is one bit clear, the goal test is a comparison with 0, and
+    hashing a state costs the same as hashing an int.  Every layout gets its
+    own subclass (see forLayout) that holds the food cells.  The class also
+    answers the Grid queries older heuristics use (asList, count, copy,
+    width, height and foodGrid[x][y]), so those heuristics keep working.
+    """
+    __slots__ = ()
+    cells = () # cells[i] = (x,y) of food bit i
+    bits = {} # bits[(x,y)] = 1 << i
+    width, height = 0, 0
+
+    @classmethod
+    def forLayout(cls, foodGrid):
+        "Returns the mask with every food of foodGrid (a Grid) uneaten."
+        cells = tuple(foodGrid.asList())
+        layout = type(cls.__name__, (cls,), {'__slots__': (), 'cells': cells,
+                                             'bits': dict([(cell, 1 << i) for i, cell in enumerate(cells)]),
+                                             'width': foodGrid.width, 'height': foodGrid.height})
+        return layout((1 << len(cells)) - 1)
+
+    def eat(self, position):
+        "Returns the food left after Pacman steps on position."
+        bit = self.bits.get(position, 0)
+        if self & bit: return type(self)(self & ~bit)
+        return self
+
+    def hasFood(self, x, y):
+        return bool(self & self.bits.get((x, y), 0))
+
+    def asList(self, key=True):
+        return [cell for i, cell in enumerate(self.cells) if bool(self >> i & 1) == key]
+
+    def count(self, item=True):
+        left = bin(self).count('1')
+        return left if item else self.width * self.height - left
+
+    def copy(self):
+        return self # immutable, like any int
+
+    def __getitem__(self, x):
+        return [self.hasFood(x, y) for y in range(self.height)]
+
 class FoodSearchProblem:
     """
     A search problem associated with finding the a path that collects all of the
@@ -451,11 +780,13 @@ class FoodSearchProblem:
 
     A search state in this problem is a tuple ( pacmanPosition, foodGrid ) where
       pacmanPosition: a tuple (x,y) of integers specifying Pacman's position
-      foodGrid:       a Grid (see game.py) of either True or False, specifying remaining food
+      foodGrid:       a FoodBits bitmask of the remaining food, which can also be
+                      read like a Grid (see game.py) of either True or False
     """
     def __init__(self, startingGameState):
-        self.start = (startingGameState.getPacmanPosition(), startingGameState.getFood())
+        self.start = (startingGameState.getPacmanPosition(), FoodBits.forLayout(startingGameState.getFood()))
         self.walls = startingGameState.getWalls()
+        self.adjacency = getGridAdjacency(self.walls)
         self.startingGameState = startingGameState
         self._expanded = 0 # DO NOT CHANGE
         self.heuristicInfo = {} # A dictionary for the heuristic to store information
@@ -464,21 +795,13 @@ class FoodSearchProblem:
         return self.start
 
     def isGoalState(self, state):
-        return state[1].count() == 0
+        return state[1] == 0
 
     def getSuccessors(self, state):
         "Returns successor states, the actions they require, and a cost of 1."
-        successors = []
         self._expanded += 1 # DO NOT CHANGE
-        for direction in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x,y = state[0]
-            dx, dy = Actions.directionToVector(direction)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                nextFood = state[1].copy()
-                nextFood[nextx][nexty] = False
-                successors.append( ( ((nextx, nexty), nextFood), direction, 1) )
-        return successors
+        food = state[1]
+        return [((nextPosition, food.eat(nextPosition)), direction, 1) for nextPosition, direction in self.adjacency.successors(state[0])]
 
     def getCostOfActions(self, actions):
         """Returns the cost of a particular sequence of actions.  If those actions
@@ -497,7 +820,7 @@ class FoodSearchProblem:
 class AStarFoodSearchAgent(SearchAgent):
     "A SearchAgent for FoodSearchProblem using A* and your foodHeuristic"
     def __init__(self):
-        self.searchFunction = lambda prob: search.aStarSearch(prob, foodHeuristic)
+        self.searchFunction = lambda prob, stats=None: search.aStarSearch(prob, foodHeuristic, stats)
         self.searchType = FoodSearchProblem
 
 def foodHeuristic(state, problem):
@@ -513,9 +836,10 @@ def foodHeuristic(state, problem):
     other hand, inadmissible or inconsistent heuristics may find optimal
     solutions, so be careful.
 
-    The state is a tuple ( pacmanPosition, foodGrid ) where foodGrid is a Grid
-    (see game.py) of either True or False. You can call foodGrid.asList() to get
-    a list of food coordinates instead.
+    The state is a tuple ( pacmanPosition, foodGrid ) where foodGrid is a
+    FoodBits bitmask that reads like a Grid (see game.py) of either True or
+    False. You can call foodGrid.asList() to get a list of food coordinates
+    instead.
 
     If you want access to info like walls, capsules, etc., you can query the
     problem.  For example, problem.walls gives you a Grid of where the walls
@@ -530,22 +854,318 @@ def foodHeuristic(state, problem):
     """
     position, foodGrid = state
     "*** YOUR CODE HERE ***"
-    return 0
+
+    #h = (maze distance to the nearest food) + (weight of the minimum spanning tree of the food left)
+    #Any path that eats everything first reaches some food, then connects all of the food : admissible.
+    #Eating a food f lowers the MST by at most the edge from f to the rest : consistent.
+    foodList = foodGrid.asList()
+    if not foodList: return 0
+
+    info = problem.heuristicInfo
+    if 'distances' not in info:
+        info['distances'] = getMazeDistances(problem.walls)
+        info['mst'] = OrderedDict() #food set -> MST weight, least recently used first
+    distances = info['distances']
+
+    mstCache = info['mst']
+    if foodGrid in mstCache:
+        mstCache.move_to_end(foodGrid)
+        mst = mstCache[foodGrid]
+    else:
+        mst = foodMSTWeight(foodList, distances)
+        mstCache[foodGrid] = mst
+        if len(mstCache) > info.get('mstCacheSize', FOOD_MST_CACHE_SIZE): mstCache.popitem(last=False)
+
+    return min([distances.getDistance(position, food) for food in foodList]) + mst
+
+FOOD_MST_CACHE_SIZE = 50000 # food sets whose MST weight foodHeuristic remembers (override with heuristicInfo['mstCacheSize'])
+
+def foodMSTWeight(foodList, distances):
+    "Weight of the minimum spanning tree of foodList in maze distance (Prim's algorithm on a MazeDistances)."
+    size, matrix = distances.size, distances.matrix
+    ids = [distances.cellIds[food] for food in foodList]
+    row = ids[0] * size
+    best = dict([(cell, matrix[row + cell]) for cell in ids[1:]]) #cheapest edge from the tree to every other food
+
+    total = 0
+    while best:
+        cell = min(best, key=best.get)
+        total += best.pop(cell)
+        row = cell * size
+        for other in best:
+            if matrix[row + other] < best[other]: best[other] = matrix[row + other]
+    return total
+
+class FoodDistanceField:
+    """
+    The maze distance from every open cell to its nearest remaining food.
+
+    The field is built with one multi-source BFS from all the food.  Every
+    cell also remembers which food it is closest to, so when a dot is eaten
+    only the cells that were closest to it are reset and repaired from
+    their neighbours, instead of searching the whole maze again.  Walking
+    downhill on the field from any cell reaches the nearest food in time
+    proportional to the length of the path.
+    """
+
+    def __init__(self, walls, food):
+        self.adjacency = getGridAdjacency(walls)
+        adjacency = self.adjacency
+        inf = float("inf")
+        self.distance = [inf] * adjacency.size
+        self.source = [-1] * adjacency.size # id of the food each cell is closest to, -1 if none is reachable
+        self.food = set([adjacency.cellIds[position] for position in food.asList()])
+
+        layer = list(self.food)
+        for cell in layer:
+            self.distance[cell] = 0
+            self.source[cell] = cell
+        while layer:
+            nextLayer = []
+            for cell in layer:
+                for n in self.neighbors(cell):
+                    if self.distance[n] == inf:
+                        self.distance[n] = self.distance[cell] + 1
+                        self.source[n] = self.source[cell]
+                        nextLayer.append(n)
+            layer = nextLayer
+
+    def neighbors(self, cell):
+        return self.adjacency.neighbors[self.adjacency.offsets[cell]:self.adjacency.offsets[cell+1]]
+
+    def foodLeft(self):
+        return len(self.food)
+
+    def removeFood(self, position):
+        "Updates the field after the food at position is eaten."
+        cell = self.adjacency.cellIds[position]
+        if cell not in self.food: return
+        self.food.discard(cell)
+        inf = float("inf")
+        distance, source = self.distance, self.source
+
+        #the cells that were closest to this food form a connected region around it
+        region, layer = [cell], [cell]
+        source[cell] = -2
+        while layer:
+            nextLayer = []
+            for v in layer:
+                for n in self.neighbors(v):
+                    if source[n] == cell:
+                        source[n] = -2
+                        nextLayer.append(n)
+            region += nextLayer
+            layer = nextLayer
+
+        #everything outside the region keeps its distance : seed the region from its border
+        fringe = []
+        for v in region:
+            distance[v], source[v] = inf, -1
+        for v in region:
+            for n in self.neighbors(v):
+                if source[n] >= 0 and distance[n] + 1 < distance[v]:
+                    distance[v], source[v] = distance[n] + 1, source[n]
+            if distance[v] < inf: heapq.heappush(fringe, (distance[v], v))
+
+        while fringe:
+            d, v = heapq.heappop(fringe)
+            if d > distance[v]: continue
+            for n in self.neighbors(v):
+                if d + 1 < distance[n]: #only cells of the region can get closer
+                    distance[n], source[n] = d + 1, source[v]
+                    heapq.heappush(fringe, (d + 1, n))
+
+    def pathToClosestDot(self, position):
+        """
+        Returns (actions, food position) for the way downhill from position
+        to its nearest food, or ([], position) if no food is reachable.
+        """
+        adjacency = self.adjacency
+        cell = adjacency.cellIds[position]
+        if self.source[cell] < 0: return [], position
+
+        actions = []
+        while self.distance[cell] > 0:
+            for edge in range(adjacency.offsets[cell], adjacency.offsets[cell+1]):
+                if self.distance[adjacency.neighbors[edge]] == self.distance[cell] - 1:
+                    actions.append(adjacency.actions[edge])
+                    cell = adjacency.neighbors[edge]
+                    break
+        return actions, adjacency.cells[cell]
+
+class DStarLitePlanner:
+    """
+    Incremental shortest paths (D* Lite) from a moving start to the nearest
+    of a changing set of goal cells, with step costs that can change
+    between calls.
+
+    The search runs backwards from the goals: g[cell] is the cost of the
+    cheapest way from cell to a goal and rhs[cell] its one-step lookahead,
+    and the cells where the two disagree wait in a priority queue.  When
+    cell costs change, goals are added or removed, or the start moves, only
+    the values those changes invalidate are repaired, so the work of the
+    next plan() grows with the size of the change rather than of the maze.
+    The heuristic is measured from the start, so moving the start only
+    raises the key modifier km instead of reordering the queue.
+
+    Stepping into a cell costs that cell's cost (1 unless changed, as in
+    PositionSearchProblem); a cost of None blocks the cell.  minCost must
+    stay a lower bound on every cost, as it scales the Manhattan heuristic.
+    """
+
+    def __init__(self, walls, start, goals, costs={}, minCost=1):
+        self.adjacency = getGridAdjacency(walls)
+        adjacency = self.adjacency
+        inf = float("inf")
+        self.minCost = minCost
+        self.cost = [1] * adjacency.size
+        for position, cost in costs.items():
+            self.cost[adjacency.cellIds[position]] = inf if cost is None else cost
+        self.g = [inf] * adjacency.size
+        self.rhs = [inf] * adjacency.size
+        self.queue = [] # (key, cell) entries; an entry is stale once queued holds another key for its cell
+        self.queued = {} # cell -> its current key
+        self.km = 0
+        self.start = self.last = adjacency.cellIds[start]
+        self.goals = set()
+        self.expanded = 0 # cells expanded by every plan() so far
+        self.setGoals(goals)
+
+    def neighbors(self, cell):
+        return self.adjacency.neighbors[self.adjacency.offsets[cell]:self.adjacency.offsets[cell+1]]
+
+    def heuristic(self, cell):
+        (x1, y1), (x2, y2) = self.adjacency.cells[self.start], self.adjacency.cells[cell]
+        return self.minCost * (abs(x1 - x2) + abs(y1 - y2))
+
+    def calculateKey(self, cell):
+        k2 = min(self.g[cell], self.rhs[cell])
+        return (k2 + self.heuristic(cell) + self.km, k2)
+
+    def lookahead(self, cell):
+        "Returns the cost of the cheapest step out of cell plus the cost to go after it."
+        if cell in self.goals: return 0
+        return min([self.cost[n] + self.g[n] for n in self.neighbors(cell)] + [float("inf")])
+
+    def updateVertex(self, cell):
+        if self.g[cell] != self.rhs[cell]:
+            key = self.calculateKey(cell)
+            if self.queued.get(cell) != key:
+                self.queued[cell] = key
+                heapq.heappush(self.queue, (key, cell))
+        elif cell in self.queued:
+            del self.queued[cell] #its heap entry goes stale
+
+    def setGoals(self, goals):
+        "Makes the positions in goals the goal cells; only the goals added or removed are repaired."
+        cellIds = self.adjacency.cellIds
+        goals = set([cellIds[position] for position in goals])
+        for cell in self.goals - goals:
+            self.goals.discard(cell)
+            self.rhs[cell] = self.lookahead(cell)
+            self.updateVertex(cell)
+        for cell in goals - self.goals:
+            self.goals.add(cell)
+            self.rhs[cell] = 0
+            self.updateVertex(cell)
+
+    def moveStart(self, position):
+        "Moves the start to position."
+        cell = self.adjacency.cellIds[position]
+        if cell == self.start: return
+        self.start = cell
+        self.km += self.heuristic(self.last) #every key in the queue is now this much too high
+        self.last = cell
+
+    def updateCells(self, costs):
+        "Changes the cost of stepping into cells; costs maps positions to their new cost (None blocks the cell)."
+        inf = float("inf")
+        g, rhs = self.g, self.rhs
+        for position, cost in costs.items():
+            v = self.adjacency.cellIds[position]
+            old, new = self.cost[v], inf if cost is None else cost
+            assert new >= self.minCost, 'cell cost below minCost: ' + str(position)
+            if new == old: continue
+            self.cost[v] = new
+            for u in self.neighbors(v): #only the edges into v changed
+                if u in self.goals: continue
+                if new < old: rhs[u] = min(rhs[u], new + g[v])
+                elif rhs[u] == old + g[v]: rhs[u] = self.lookahead(u)
+                self.updateVertex(u)
+
+    def computeShortestPath(self):
+        inf = float("inf")
+        g, rhs, cost, queue, queued = self.g, self.rhs, self.cost, self.queue, self.queued
+        while queue:
+            key, u = queue[0]
+            if queued.get(u) != key:
+                heapq.heappop(queue)
+                continue
+            if key >= self.calculateKey(self.start) and g[self.start] == rhs[self.start]: break
+            heapq.heappop(queue)
+            newKey = self.calculateKey(u)
+            if key < newKey: #the start moved since u was queued
+                queued[u] = newKey
+                heapq.heappush(queue, (newKey, u))
+                continue
+            del queued[u]
+            self.expanded += 1
+            if g[u] > rhs[u]: #u got cheaper : its neighbours may now go through it
+                g[u] = rhs[u]
+                for s in self.neighbors(u):
+                    if s not in self.goals and cost[u] + g[u] < rhs[s]:
+                        rhs[s] = cost[u] + g[u]
+                        self.updateVertex(s)
+            else: #u got dearer : whoever went through it looks again
+                gOld, g[u] = g[u], inf
+                for s in list(self.neighbors(u)) + [u]:
+                    if s not in self.goals and (s == u or rhs[s] == cost[u] + gOld):
+                        rhs[s] = self.lookahead(s)
+                    self.updateVertex(s)
+
+    def plan(self):
+        """
+        Repairs the search after the changes made since the last call and
+        returns the actions of a cheapest path from the start to the nearest
+        goal, or [] if the start is a goal or no goal can be reached.
+        """
+        self.computeShortestPath()
+        adjacency, g, cost = self.adjacency, self.g, self.cost
+        cell, actions = self.start, []
+        if g[cell] == float("inf"): return actions
+        while cell not in self.goals and len(actions) < adjacency.size:
+            best = min(range(adjacency.offsets[cell], adjacency.offsets[cell+1]),
+                       key=lambda edge: cost[adjacency.neighbors[edge]] + g[adjacency.neighbors[edge]])
+            actions.append(adjacency.actions[best])
+            cell = adjacency.neighbors[best]
+        return actions
+
+    def replan(self, start=None, goals=None, costs=None):
+        "Applies whichever of a new start, goal positions and cell costs are given, then returns plan()."
+        if start is not None: self.moveStart(start)
+        if goals is not None: self.setGoals(goals)
+        if costs: self.updateCells(costs)
+        return self.plan()
 
 class ClosestDotSearchAgent(SearchAgent):
-    "Search for all food using a sequence of searches"
+    """
+    Search for all food using a sequence of searches
+
+    The searches share one FoodDistanceField: every leg walks downhill to
+    the closest dot, and eating it only repairs the part of the field that
+    pointed at that dot.  The legs are built from the legal moves of the
+    layout, so they are not replayed on game states.
+    """
     def registerInitialState(self, state):
         self.actions = []
-        currentState = state
-        while(currentState.getFood().count() > 0):
-            nextPathSegment = self.findPathToClosestDot(currentState) # The missing piece
+        field = FoodDistanceField(state.getWalls(), state.getFood())
+        position = state.getPacmanPosition()
+        while(field.foodLeft() > 0):
+            nextPathSegment, position = field.pathToClosestDot(position)
+            if not nextPathSegment:
+                raise Exception('No food is reachable from %s' % str(position))
             self.actions += nextPathSegment
-            for action in nextPathSegment:
-                legal = currentState.getLegalActions()
-                if action not in legal:
-                    t = (str(action), str(currentState))
-                    raise Exception('findPathToClosestDot returned an illegal move: %s!\n%s' % t)
-                currentState = currentState.generateSuccessor(0, action)
+            field.removeFood(position)
         self.actionIndex = 0
         print('Path found with cost %d.' % len(self.actions))
 
@@ -558,10 +1178,9 @@ class ClosestDotSearchAgent(SearchAgent):
         startPosition = gameState.getPacmanPosition()
         food = gameState.getFood()
         walls = gameState.getWalls()
-        problem = AnyFoodSearchProblem(gameState)
 
         "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        return FoodDistanceField(walls, food).pathToClosestDot(startPosition)[0]
 
 class AnyFoodSearchProblem(PositionSearchProblem):
     """
@@ -587,6 +1206,8 @@ class AnyFoodSearchProblem(PositionSearchProblem):
         self.walls = gameState.getWalls()
         self.startState = gameState.getPacmanPosition()
         self.costFn = lambda x: 1
+        self.adjacency = getGridAdjacency(self.walls)
+        self._successors = {}
         self._visited, self._visitedlist, self._expanded = {}, [], 0 # DO NOT CHANGE
 
     def isGoalState(self, state):
@@ -597,7 +1218,7 @@ class AnyFoodSearchProblem(PositionSearchProblem):
         x,y = state
 
         "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        return self.food[x][y]
 
 def mazeDistance(point1, point2, gameState):
     """
@@ -608,11 +1229,168 @@ def mazeDistance(point1, point2, gameState):
     Example usage: mazeDistance( (2,4), (5,6), gameState)
 
     This might be a useful helper function for your ApproximateSearchAgent.
+
+    The distances come from the all-pairs table of the layout (see
+    getMazeDistances), so only the first call on a new layout pays for a
+    search, and only the first call with a new walls Grid hashes the walls.
+    For the distances between many points at once use mazeDistances.
     """
     x1, y1 = point1
     x2, y2 = point2
     walls = gameState.getWalls()
     assert not walls[x1][y1], 'point1 is a wall: ' + str(point1)
     assert not walls[x2][y2], 'point2 is a wall: ' + str(point2)
-    prob = PositionSearchProblem(gameState, start=point1, goal=point2, warn=False, visualize=False)
-    return len(search.bfs(prob))
+    return getMazeDistances(walls).getDistance(point1, point2)
+
+def mazeDistances(sources, targets, gameState):
+    """
+    The batch form of mazeDistance: returns the maze distances from every
+    point of sources to every point of targets as one flat array('H'), row
+    by row, so the distance from sources[i] to targets[j] is at
+    i * len(targets) + j.  sources may also be a single point, which gives
+    the row of that point alone.
+
+    Example usage: min(mazeDistances(position, foodList, gameState))
+
+    If the all-pairs table of the layout is already loaded the rows are read
+    from it.  Otherwise every source runs one BFS over the adjacency arrays
+    of the layout that stops as soon as all targets are reached, which is far
+    cheaper than building the table for a few questions.  Targets that
+    cannot be reached are MazeDistances.UNREACHABLE away.
+    """
+    walls = gameState.getWalls()
+    if len(sources) > 0 and not isinstance(sources[0], (tuple, list)): sources = [sources]
+    key = wallLayoutKey(walls)
+    adjacency = _gridAdjacencies.get(key) or getGridAdjacency(walls)
+    cellIds, offsets, neighbors = adjacency.cellIds, adjacency.offsets, adjacency.neighbors
+    for point in list(sources) + list(targets):
+        assert point in cellIds, 'not an open cell: ' + str(point)
+
+    width = len(targets)
+    distances = array('H', [MazeDistances.UNREACHABLE]) * (len(sources) * width)
+    targetIds = [cellIds[target] for target in targets]
+    table = _mazeDistanceTables.get(key)
+    if table is not None:
+        for i, source in enumerate(sources):
+            row, base = i * width, cellIds[source] * table.size
+            for j, target in enumerate(targetIds):
+                distances[row + j] = table.matrix[base + target]
+        return distances
+
+    columns = {} # target cell id -> its columns in a row (targets may repeat)
+    for j, target in enumerate(targetIds):
+        columns.setdefault(target, []).append(j)
+    for i, source in enumerate(sources):
+        row, remaining = i * width, len(columns)
+        seen = bytearray(adjacency.size)
+        seen[cellIds[source]] = 1
+        layer, depth = [cellIds[source]], 0
+        while layer:
+            for cell in layer: # every cell of a layer is depth away
+                if cell in columns:
+                    for j in columns[cell]: distances[row + j] = depth
+                    remaining -= 1
+            if remaining == 0: break
+            depth += 1
+            nextLayer = []
+            for cell in layer:
+                for k in range(offsets[cell], offsets[cell + 1]):
+                    n = neighbors[k]
+                    if not seen[n]:
+                        seen[n] = 1
+                        nextLayer.append(n)
+            layer = nextLayer
+    return distances
+
+MAZE_DISTANCE_CACHE = os.path.join(tempfile.gettempdir(), 'pacman-maze-distances')
+
+_wallLayoutKeys = {} # id(walls) -> (weak reference to walls, its layout key)
+
+def wallLayoutKey(walls):
+    """
+    Returns a hash that identifies a wall layout (a Grid, see game.py).
+
+    Every game state of a layout shares one walls Grid, so the hash is
+    computed once per Grid object and then found by its id.  Grid's own
+    __hash__ walks every cell, which is why the memo is not keyed on it.
+    """
+    entry = _wallLayoutKeys.get(id(walls))
+    if entry is not None and entry[0]() is walls: return entry[1]
+    layout = ''.join(['1' if walls[x][y] else '0' for x in range(walls.width) for y in range(walls.height)])
+    key = hashlib.sha1(('%d,%d:' % (walls.width, walls.height) + layout).encode()).hexdigest()
+    wallsId = id(walls)
+    _wallLayoutKeys[wallsId] = (weakref.ref(walls, lambda ref: _wallLayoutKeys.pop(wallsId, None)), key)
+    return key
+
+class MazeDistances:
+    """
+    Shortest maze distances between every pair of open cells of a layout.
+
+    The open cells are numbered column by column, and the distances are kept
+    in one flat array of unsigned shorts indexed by id1 * size + id2, so a
+    query is two dictionary lookups and an array read.  The table is built
+    with one BFS per open cell and saved under cacheDir in a file named
+    after the hash of the walls; later runs on the same layout memory-map
+    that file instead of searching again.  Cells that cannot reach each
+    other are UNREACHABLE apart.
+    """
+    UNREACHABLE = 0xFFFF
+
+    def __init__(self, walls, cacheDir=MAZE_DISTANCE_CACHE):
+        self.adjacency = getGridAdjacency(walls)
+        self.cells, self.cellIds, self.size = self.adjacency.cells, self.adjacency.cellIds, self.adjacency.size
+        assert self.size < self.UNREACHABLE, 'too many open cells for a distance table'
+
+        self.path = os.path.join(cacheDir, wallLayoutKey(walls) + '.dist')
+        if not os.path.exists(self.path) or os.path.getsize(self.path) != 2 * self.size * self.size:
+            self.save(self.compute())
+        self.load()
+
+    def compute(self):
+        "Runs a BFS from every open cell and returns the distances as an array."
+        offsets, adjacent = self.adjacency.offsets, self.adjacency.neighbors
+        neighbors = [adjacent[offsets[i]:offsets[i+1]] for i in range(self.size)]
+
+        size = self.size
+        matrix = array('H', [self.UNREACHABLE]) * (size * size)
+        for source in range(size):
+            row = source * size
+            matrix[row + source] = 0
+            layer, depth = [source], 0
+            while layer:
+                depth += 1
+                nextLayer = []
+                for cell in layer:
+                    for n in neighbors[cell]:
+                        if matrix[row + n] == self.UNREACHABLE:
+                            matrix[row + n] = depth
+                            nextLayer.append(n)
+                layer = nextLayer
+        return matrix
+
+    def save(self, matrix):
+        "Writes the table to its cache file; the rename makes concurrent writers safe."
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory): os.makedirs(directory, exist_ok=True)
+        temp = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(temp, 'wb') as f:
+            matrix.tofile(f)
+        os.replace(temp, self.path)
+
+    def load(self):
+        "Memory-maps the cache file; pages are read lazily by the OS."
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.matrix = memoryview(self._map).cast('H')
+
+    def getDistance(self, pos1, pos2):
+        return self.matrix[self.cellIds[pos1] * self.size + self.cellIds[pos2]]
+
+_mazeDistanceTables = {} # wall layout key -> MazeDistances, shared by every caller in this process
+
+def getMazeDistances(walls):
+    "Returns the MazeDistances of a wall layout, building or loading it only once."
+    key = wallLayoutKey(walls)
+    if key not in _mazeDistanceTables:
+        _mazeDistanceTables[key] = MazeDistances(walls)
+    return _mazeDistanceTables[key]
@@ -0,0 +1,199 @@
+# searchBenchmark.py
+# ------------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Headless benchmark of the algorithms in search.py.
+
+Every case of the suite builds its search problem straight from a layout file
+(no graphics, no game loop), runs one search function with one heuristic a
+few times, and records the nodes expanded, the best wall time and the peak
+memory of the search.  The results can be saved as a baseline and later runs
+compared against it:
+
+> python searchBenchmark.py --save-baseline benchmark.json
+> python searchBenchmark.py --baseline benchmark.json --threshold 0.2
+
+The second command exits with status 1 if any case expands more nodes, runs
+slower or needs more memory than the baseline by more than 20%, or if a case
+of the baseline was not measured at all.
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from optparse import OptionParser
+
+import layout
+import pacman
+import search
+import searchAgents
+
+# (problem type, layout, search function, heuristic[, keyword arguments]);
+# heuristic None means the search function takes no heuristic
+DEFAULT_SUITE = [
+    ('PositionSearchProblem', 'mediumMaze', 'dfs', None),
+    ('PositionSearchProblem', 'mediumMaze', 'bfs', None),
+    ('PositionSearchProblem', 'mediumMaze', 'ucs', None),
+    ('PositionSearchProblem', 'bigMaze', 'bfs', None),
+    ('PositionSearchProblem', 'bigMaze', 'astar', 'nullHeuristic'),
+    ('PositionSearchProblem', 'bigMaze', 'astar', 'manhattanHeuristic'),
+    ('PositionSearchProblem', 'bigMaze', 'astar', 'euclideanHeuristic'),
+    ('PositionSearchProblem', 'bigMaze', 'astar', 'myHeuristic'),
+    ('CornersProblem', 'mediumCorners', 'bfs', None),
+    ('CornersProblem', 'mediumCorners', 'astar', 'cornersHeuristic'),
+    ('FoodSearchProblem', 'trickySearch', 'ucs', None),
+    ('FoodSearchProblem', 'trickySearch', 'astar', 'foodHeuristic'),
+    ('PositionSearchProblem', 'mediumMaze', 'smastar', 'manhattanHeuristic', {'maxNodes': 200}),
+    # a budget smaller than the path : must give up with [] (cost 0) instead of looping
+    ('PositionSearchProblem', 'mediumMaze', 'smastar', 'manhattanHeuristic', {'maxNodes': 10}),
+]
+
+def caseName(case):
+    problemType, layoutName, fn, heuristic = case[:4]
+    name = '%s/%s/%s' % (problemType, layoutName, fn if heuristic is None else fn + ',' + heuristic)
+    for key, value in sorted(caseOptions(case).items()):
+        name += ',%s=%s' % (key, value)
+    return name
+
+def caseOptions(case):
+    "Returns the extra keyword arguments of the search function in a case."
+    return case[4] if len(case) > 4 else {}
+
+def loadState(layoutName):
+    "Returns the starting GameState of a layout, without any display."
+    lay = layout.getLayout(layoutName)
+    if lay is None: raise Exception('The layout ' + layoutName + ' cannot be found')
+    state = pacman.GameState()
+    state.initialize(lay, 0)
+    return state
+
+def makeProblem(problemType, state):
+    if problemType == 'PositionSearchProblem':
+        return searchAgents.PositionSearchProblem(state, warn=False, visualize=False)
+    return getattr(searchAgents, problemType)(state)
+
+def runCase(case, repeats):
+    """
+    Runs one case repeats times for timing, plus once under tracemalloc for
+    the peak memory, and returns its measurements.
+    """
+    problemType, layoutName, fn, heuristic = case[:4]
+    options = caseOptions(case)
+    state = loadState(layoutName)
+    func = getattr(search, fn)
+    if heuristic is not None:
+        heur = getattr(searchAgents, heuristic, None) or getattr(search, heuristic)
+        run = lambda problem, stats: func(problem, heuristic=heur, stats=stats, **options)
+    else:
+        run = lambda problem, stats: func(problem, stats=stats, **options)
+
+    times = []
+    for i in range(repeats):
+        problem = makeProblem(problemType, state)
+        start = time.perf_counter()
+        actions = run(problem, search.SearchStats(timed=False))
+        times.append(time.perf_counter() - start)
+    result = {'expanded': problem._expanded, 'cost': problem.getCostOfActions(actions), 'time': min(times)}
+
+    problem = makeProblem(problemType, state)
+    tracemalloc.start()
+    run(problem, search.SearchStats(timed=False))
+    result['memory'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+# measurements that must not grow past the threshold
+GATED = ('expanded', 'time', 'memory')
+
+def compare(results, baseline, threshold):
+    "Returns a list of (case, measurement, baseline value, new value) regressions."
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline: continue
+        for key in GATED:
+            old, new = baseline[name][key], result[key]
+            if new > old * (1 + threshold):
+                regressions.append((name, key, old, new))
+        if result['cost'] != baseline[name]['cost']:
+            regressions.append((name, 'cost', baseline[name]['cost'], result['cost']))
+    return regressions
+
+def missingCases(results, baseline, keys=None):
+    """
+    Returns the names of the baseline cases that have no result, so that a
+    renamed or dropped case cannot leave the regression gate unnoticed.  With
+    keys (the --cases filter), only the baseline cases it selects count.
+    """
+    return sorted([name for name in baseline if name not in results
+                   and (not keys or any([key in name for key in keys]))])
+
+def readCommand(argv):
+    usageStr = """
+    USAGE:      python searchBenchmark.py <options>
+    EXAMPLES:   (1) python searchBenchmark.py --save-baseline benchmark.json
+                    - measures the default suite and saves it as the baseline
+                (2) python searchBenchmark.py -b benchmark.json -t 0.2 -r 5
+                    - fails if a case got more than 20% worse, timing 5 runs per case
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('-r', '--repeats', dest='repeats', type='int',
+                      help='timed runs per case; the fastest counts (default %default)', default=3)
+    parser.add_option('-b', '--baseline', dest='baseline',
+                      help='JSON file of earlier results to compare against', default=None)
+    parser.add_option('-s', '--save-baseline', dest='saveBaseline',
+                      help='save the results to this JSON file', default=None)
+    parser.add_option('-t', '--threshold', dest='threshold', type='float',
+                      help='allowed relative growth before a measurement regresses (default %default)', default=0.25)
+    parser.add_option('-c', '--cases', dest='cases',
+                      help='comma separated substrings; only cases whose name contains one of them are run', default=None)
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+def runBenchmark(options):
+    suite, keys = DEFAULT_SUITE, None
+    if options.cases:
+        keys = options.cases.split(',')
+        suite = [case for case in suite if any([key in caseName(case) for key in keys])]
+
+    results = {}
+    print('%-60s %9s %6s %9s %10s' % ('case', 'expanded', 'cost', 'time', 'memory'))
+    for case in suite:
+        result = runCase(case, options.repeats)
+        results[caseName(case)] = result
+        print('%-60s %9d %6d %8.3fs %9.1fK' % (caseName(case), result['expanded'], result['cost'],
+                                              result['time'], result['memory'] / 1024.0))
+
+    if options.saveBaseline:
+        with open(options.saveBaseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('Saved baseline to ' + options.saveBaseline)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, options.threshold)
+        missing = missingCases(results, baseline, keys)
+        for name, key, old, new in regressions:
+            print('REGRESSION %s: %s %s -> %s' % (name, key, old, new))
+        for name in missing:
+            print('MISSING %s: in the baseline but not measured' % name)
+        if regressions or missing: return 1
+        print('No regressions against ' + options.baseline)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(runBenchmark(readCommand(sys.argv[1:])))
@@ -14,8 +14,9 @@
 
 from cmath import inf
 from util import manhattanDistance
-from game import Directions
-import random, util
+from game import Directions, Actions
+import random, util, time, math
+import multiprocessing
 
 from game import Agent
 
@@ -110,6 +111,181 @@ def scoreEvaluationFunction(currentGameState):
     """
     return currentGameState.getScore()
 
+def scoreEvaluationBounds(gameState, pacmanMoves):
+    """
+    Bounds (lower, upper) on scoreEvaluationFunction of every state reached
+    from gameState in at most pacmanMoves moves of Pacman and the ghost moves
+    between them.  A Pacman move costs 1 and eats at most one food (+10), the
+    last food wins (+500), a scared ghost eaten gives 200 (once per ghost and
+    scare : an eaten ghost comes back unscared) and being caught -500.
+    """
+    score = gameState.getScore()
+    food = gameState.getNumFood()
+    scared = any([ghostState.scaredTimer > 0 for ghostState in gameState.getGhostStates()])
+    scares = (1 if scared else 0) + min(len(gameState.getCapsules()), pacmanMoves) #the scare now and one per capsule eaten
+    if food <= pacmanMoves: foodGain = 9 * food + 500 #eats all the food and wins
+    else: foodGain = 9 * pacmanMoves
+    return score - pacmanMoves - 500, score + foodGain + 200 * (gameState.getNumAgents() - 1) * scares
+
+class ZobristHasher:
+    """
+    Zobrist hashing of the parts of a GameState that decide its future:
+    Pacman's position, every ghost's position, direction (ghosts cannot
+    turn back) and scared timer, the food and the capsules.
+
+    Each such fact gets its own random 64-bit key the first time it is
+    seen, and the hash of a state is the XOR of the keys of its facts.  A
+    successor's hash is computed from its parent's by swapping out only the
+    facts that changed, so hashing a search node does not walk the food
+    grid.
+    """
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed) #fixed seed : the same state always gets the same hash
+        self.keys = {} #fact -> its random key
+
+    def key(self, fact):
+        k = self.keys.get(fact)
+        if k is None: k = self.keys[fact] = self.random.getrandbits(64)
+        return k
+
+    def agentKey(self, gameState, agentIndex):
+        if agentIndex == 0: return self.key((0, gameState.getPacmanPosition()))
+        ghostState = gameState.getGhostState(agentIndex)
+        return self.key((agentIndex, ghostState.getPosition(), ghostState.getDirection(), ghostState.scaredTimer))
+
+    def hash(self, gameState):
+        "Hash of a state computed from scratch."
+        h = 0
+        for agentIndex in range(gameState.getNumAgents()): h ^= self.agentKey(gameState, agentIndex)
+        for foodPos in gameState.getFood().asList(): h ^= self.key(('food', foodPos))
+        for capsulePos in gameState.getCapsules(): h ^= self.key(('capsule', capsulePos))
+        return h
+
+    def childHash(self, h, gameState, successor, agentIndex):
+        "Hash of successor, generated from gameState (whose hash is h) by a move of agentIndex."
+        #a move can change every agent (a capsule scares all ghosts, an eaten ghost goes home)
+        for index in range(gameState.getNumAgents()):
+            before, after = self.agentKey(gameState, index), self.agentKey(successor, index)
+            if before != after: h ^= before ^ after
+        if agentIndex == 0: #only pacman eats
+            x, y = successor.getPacmanPosition()
+            if gameState.hasFood(x, y): h ^= self.key(('food', (x, y)))
+            if (x, y) in gameState.getCapsules(): h ^= self.key(('capsule', (x, y)))
+        return h
+
+class TranspositionTable:
+    """
+    A fixed number of slots of search results, indexed by Zobrist hash.
+
+    An entry remembers the value of a node searched depth plies deep,
+    whether that value is EXACT, a LOWER bound (the search was cut off
+    above beta) or an UPPER bound (cut off below alpha), and the move that
+    gave the value, which is worth trying first at any depth.  The hash, the
+    agent to move and the score are all checked on lookup, because the
+    score is not part of the hash but the evaluation may depend on it.
+
+    When two nodes want the same slot the deeper search is kept, unless
+    the entry is left over from an earlier move (newSearch), which is
+    always replaced.
+    """
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, size):
+        self.size = size
+        self.slots = [None] * size
+        self.age = 0
+        self.probes, self.hits, self.stores = 0, 0, 0
+
+    def newSearch(self):
+        "Marks every entry so far as old, letting the next search replace them freely."
+        self.age += 1
+
+    def lookup(self, h, agentIndex, score, depth):
+        "Returns (value, bound type) for the node, or None."
+        self.probes += 1
+        entry = self.slots[h % self.size]
+        #only a search of exactly the same depth gives the value the search would give now
+        if entry is None or entry[0] != h or entry[1] != agentIndex or entry[2] != score or entry[3] != depth: return None
+        self.hits += 1
+        return entry[4], entry[5]
+
+    def move(self, h, agentIndex, score):
+        "Returns the best move stored for the node by a search of any depth, or None."
+        entry = self.slots[h % self.size]
+        if entry is None or entry[0] != h or entry[1] != agentIndex or entry[2] != score: return None
+        return entry[6]
+
+    def store(self, h, agentIndex, score, depth, value, bound, move=None):
+        slot = h % self.size
+        entry = self.slots[slot]
+        if entry is not None and entry[7] == self.age and entry[3] > depth and entry[0] != h: return #keep the deeper one
+        self.stores += 1
+        self.slots[slot] = (h, agentIndex, score, depth, value, bound, move, self.age)
+
+class MoveOrdering:
+    """
+    Orders the moves of an alpha-beta node so that the ones likely to cause
+    a cutoff are searched first: the transposition table's best move, then
+    the killer moves of the ply (the last two moves that caused a cutoff at
+    that depth and agent), then the rest by their history score, the sum of
+    depthLeft^2 over the cutoffs the move caused from the same position.
+    Moves that tie keep the engine's order.
+
+    Alpha-beta returns the same values in any order, only faster in a good
+    one.  The counters tell how good it is: a well ordered search makes
+    most of its cutoffs on the first move it tries.
+    """
+
+    def __init__(self):
+        self.killers = {} #ply -> up to two moves, most recent first
+        self.history = {} #(context, move) -> score
+        self.nodes, self.cutoffs, self.firstMoveCutoffs = 0, 0, 0
+
+    def newSearch(self):
+        "Forgets the killers and halves the history, which are about the position searched before."
+        self.killers = {}
+        for key in list(self.history.keys()):
+            self.history[key] //= 2
+            if self.history[key] == 0: del self.history[key]
+
+    def order(self, legalMoves, ply, context, tableMove=None):
+        self.nodes += 1
+        killers = self.killers.get(ply, [])
+        def rank(action):
+            if action == tableMove: return (0, 0)
+            if action in killers: return (1, killers.index(action))
+            return (2, -self.history.get((context, action), 0))
+        return sorted(legalMoves, key=rank)
+
+    def recordCutoff(self, action, ply, context, depthLeft, moveNumber):
+        "Records that action, the moveNumber-th move tried (from 0), cut off the search of a node."
+        self.cutoffs += 1
+        if moveNumber == 0: self.firstMoveCutoffs += 1
+        killers = self.killers.setdefault(ply, [])
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[2:]
+        self.history[(context, action)] = self.history.get((context, action), 0) + depthLeft * depthLeft
+
+    def counters(self):
+        "The nodes, cutoffs and first-move cutoffs counted so far."
+        return self.nodes, self.cutoffs, self.firstMoveCutoffs
+
+    def addCounters(self, counters):
+        "Adds the counters of a search made elsewhere, such as in a worker process."
+        nodes, cutoffs, firstMoveCutoffs = counters
+        self.nodes += nodes
+        self.cutoffs += cutoffs
+        self.firstMoveCutoffs += firstMoveCutoffs
+
+    def report(self):
+        first = 100.0 * self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+        return 'nodes %d, cutoffs %d (%.1f%% on the first move)' % (self.nodes, self.cutoffs, first)
+
+class SearchTimeout(Exception):
+    "Raised inside a search when the time budget of the move has run out."
+
 class MultiAgentSearchAgent(Agent):
     """
     This class provides some common elements to all of your
@@ -125,11 +301,107 @@ class MultiAgentSearchAgent(Agent):
     is another abstract class.
     """
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', ttSize = '0', ordering = '0', timeLimit = '0', workers = '0', star = '0'):
         self.index = 0 # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
 
+        #ttSize > 0 (-a ttSize=65536) : remember searched positions in a transposition table of that many
+        #slots, kept for the whole game (off by default : the autograder counts the states we expand)
+        self.table = TranspositionTable(int(ttSize)) if int(ttSize) > 0 else None
+        self.hasher = ZobristHasher()
+        self.nodes = 0 #max/min nodes expanded so far
+
+        #ordering=1 : alpha-beta tries the moves likely to cut off first (MoveOrdering); same actions, fewer nodes
+        self.ordering = MoveOrdering() if int(ordering) else None
+
+        #timeLimit > 0 (-a timeLimit=0.5) : search depth 1, 2, ... for that many seconds per move instead of
+        #self.depth, see deepeningAction
+        self.timeLimit = float(timeLimit)
+        self.deadline = None #time.time() at which a timed search gives up, None while no search is timed
+        self.principalMove = None #best move of the last finished iteration, searched first by the next one
+        self.hitDepthLimit = False #whether the current search cut any line off at self.depth
+        self.completedDepth = 0 #depth of the last move's deepest finished iteration
+
+        #workers > 0 (-a workers=4) : AlphaBetaAgent searches the root moves in parallel in that many processes
+        self.workers = int(workers)
+        self.pool = None
+        self.sharedAlpha = None #in a worker : the best root value found by any worker so far
+
+        #star=1 : ExpectimaxAgent prunes chance nodes (Star1) when the evaluation function has known bounds
+        #(EVALUATION_BOUNDS); same actions, fewer nodes
+        self.evaluationBounds = EVALUATION_BOUNDS.get(self.evaluationFunction) if int(star) else None
+
+    def expandNode(self):
+        "Counts a node and gives up the search if the time is up."
+        self.nodes += 1
+        if self.deadline is not None and time.time() > self.deadline: raise SearchTimeout()
+
+    def deepeningAction(self, gameState, search):
+        """
+        Iterative deepening under the time budget of a move: runs
+        search(gameState), a fixed depth search of self.depth plies, for
+        depth 1, 2, ... and returns the action of the deepest iteration that
+        finished.  An iteration still running when timeLimit seconds are up
+        is abandoned from inside (SearchTimeout) and its half-done work
+        thrown away, except what it safely left in the transposition table
+        and the move ordering.  The first iteration always finishes, however
+        long it takes.
+
+        The deepening stops early when an iteration reached the end of the
+        game on every line (deeper searches would say the same), or when
+        the last iteration took longer than the time left.
+        """
+        start = time.time()
+        depth = self.depth
+        action = None
+        self.principalMove = None
+        self.completedDepth = 0
+        try:
+            while True:
+                self.depth = self.completedDepth + 1
+                self.hitDepthLimit = False
+                self.deadline = None if action is None else start + self.timeLimit
+                iterationStart = time.time()
+                try:
+                    action = search(gameState)
+                except SearchTimeout:
+                    break
+                self.principalMove = action
+                self.completedDepth = self.depth
+                now = time.time()
+                if not self.hitDepthLimit or now + (now - iterationStart) > start + self.timeLimit: break
+        finally:
+            self.depth, self.deadline = depth, None
+        return action
+
+    def rootHash(self, gameState):
+        "Starts a new search from gameState : returns its hash, or None without a transposition table."
+        if self.ordering is not None: self.ordering.newSearch()
+        if self.table is None: return None
+        self.table.newSearch()
+        return self.hasher.hash(gameState)
+
+    def orderedMoves(self, gameState, agentIndex, depth, h=None):
+        "Legal moves of agentIndex, in the order of the move ordering if there is one."
+        legalMoves = gameState.getLegalActions(agentIndex)
+        if self.ordering is None: return legalMoves
+        tableMove = self.table.move(h, agentIndex, gameState.getScore()) if h is not None else None
+        return self.ordering.order(legalMoves, (depth, agentIndex), self.moveContext(gameState, agentIndex), tableMove)
+
+    def moveContext(self, gameState, agentIndex):
+        "Position of the agent to move : the history heuristic scores moves from it."
+        if agentIndex == 0: return (0, gameState.getPacmanPosition())
+        return (agentIndex, gameState.getGhostPosition(agentIndex))
+
+    def final(self, state):
+        "Called by the game at its end : reports how the move ordering did."
+        if self.ordering is not None: print('[%s] move ordering: %s' % (type(self).__name__, self.ordering.report()))
+
+    def childHash(self, h, gameState, successor, agentIndex):
+        if h is None: return None
+        return self.hasher.childHash(h, gameState, successor, agentIndex)
+
 class MinimaxAgent(MultiAgentSearchAgent):
     """
     Your minimax agent (question 2)
@@ -159,51 +431,98 @@ class MinimaxAgent(MultiAgentSearchAgent):
         Returns whether or not the game state is a losing state
         """
         "*** YOUR CODE HERE ***"
+        if self.timeLimit > 0: return self.deepeningAction(gameState, self.searchAction)
+        return self.searchAction(gameState)
+
+    def searchAction(self, gameState):
+        "The minimax action of a search self.depth plies deep."
         legalMoves = gameState.getLegalActions(0) #legal actions that pacman can do
 
         targetIdx = 0 #index for return
         maxValue = -float("inf") #best value among values of possible actions
+        h = self.rootHash(gameState) #None without a transposition table
 
         for actionIdx in range(len(legalMoves)):
             successor = gameState.generateSuccessor(0, legalMoves[actionIdx]) #pacman's successor for (actionIdx)th action in legalMoves
-            value = self.value(successor, 1, 0) #next agent is MIN (ghost) => agentIndex is 1 / initial depth is 0
+            value = self.value(successor, 1, 0, self.childHash(h, gameState, successor, 0)) #next agent is MIN (ghost) => agentIndex is 1 / initial depth is 0
             if value > maxValue: #better value for action
                 targetIdx = actionIdx
                 maxValue = value
 
         return legalMoves[targetIdx] #return the action that has the best value for the pacman agent
 
-    def max_value(self, gameState, agentIndex, depth):
+    def max_value(self, gameState, agentIndex, depth, h=None):
         legalMoves = gameState.getLegalActions(agentIndex)
+        self.expandNode()
 
         value = -float("inf") 
         for action in legalMoves:
             successor = gameState.generateSuccessor(agentIndex, action) #successor for each action
-            value = max(value, self.value(successor, 1, depth)) #maximum value among successors : next agent is MIN(ghost) => agentIndex is 1
+            value = max(value, self.value(successor, 1, depth, self.childHash(h, gameState, successor, agentIndex))) #maximum value among successors : next agent is MIN(ghost) => agentIndex is 1
 
         return value
 
-    def min_value(self, gameState, agentIndex, depth):
+    def min_value(self, gameState, agentIndex, depth, h=None):
         legalMoves = gameState.getLegalActions(agentIndex)
+        self.expandNode()
 
         value = float("inf")
         for action in legalMoves:
             successor = gameState.generateSuccessor(agentIndex, action) #successor for each action
+            childHash = self.childHash(h, gameState, successor, agentIndex)
             #we can have multiple MIN agents(ghosts) : their index - 1 ~ gameState.getNumAgents() - 1
             if agentIndex == gameState.getNumAgents() - 1: #if we checked the last ghost
-                value = min(value, self.value(successor, 0, depth+1)) #next agent is MAX(pacman) => agentIndex is 0 / depth should be increased
+                value = min(value, self.value(successor, 0, depth+1, childHash)) #next agent is MAX(pacman) => agentIndex is 0 / depth should be increased
             else:
-                value = min(value, self.value(successor, agentIndex+1, depth)) #next agent is MIN (other ghost) : (agentIndex)th ghost => we have to check them
+                value = min(value, self.value(successor, agentIndex+1, depth, childHash)) #next agent is MIN (other ghost) : (agentIndex)th ghost => we have to check them
 
         return value
 
-    def value(self, gameState, agentIndex, depth):
+    def value(self, gameState, agentIndex, depth, h=None):
         if self.depth == depth or gameState.isWin() or gameState.isLose(): #If we reached the pre-defined depth limit or the game is ended (win or lose)
+            if self.depth == depth: self.hitDepthLimit = True #a deeper search could say more
             return self.evaluationFunction(gameState) #we don't have to do deeper search : just return the evaluation function value
+        if h is not None: #the same position may have been reached by another order of moves
+            entry = self.table.lookup(h, agentIndex, gameState.getScore(), self.depth - depth)
+            if entry is not None:
+                self.hitDepthLimit = True #for all we know the stored search was cut off at the depth limit
+                return entry[0] #minimax only stores exact values
         if agentIndex == 0: #MAX (pacman)
-            return self.max_value(gameState, agentIndex, depth)
+            value = self.max_value(gameState, agentIndex, depth, h)
         else: #MIN (ghost)
-            return self.min_value(gameState, agentIndex, depth)
+            value = self.min_value(gameState, agentIndex, depth, h)
+        if h is not None: self.table.store(h, agentIndex, gameState.getScore(), self.depth - depth, value, TranspositionTable.EXACT)
+        return value
+
+_rootSplit = None #in a worker process of a parallel AlphaBetaAgent : (agent, lock of its shared alpha)
+
+def _initRootSplitWorker(agent, sharedAlpha, lock):
+    global _rootSplit
+    agent.sharedAlpha = sharedAlpha
+    _rootSplit = (agent, lock)
+
+def _searchRootMove(gameState, action, depth, deadline):
+    """
+    Searches one root move of a parallel AlphaBetaAgent in a worker process
+    and returns (value, nodes expanded, whether the depth limit was hit,
+    move ordering counters of this search or None); the value is None if
+    the search ran out of time.
+    """
+    agent, lock = _rootSplit
+    agent.depth, agent.deadline = depth, deadline #the worker's copy of the agent was made when the game started
+    agent.nodes, agent.hitDepthLimit = 0, False
+    before = agent.ordering.counters() if agent.ordering is not None else None
+    h = agent.rootHash(gameState)
+    successor = gameState.generateSuccessor(0, action)
+    try:
+        value = agent.value(successor, 1, 0, agent.sharedAlpha.value, float("inf"), agent.childHash(h, gameState, successor, 0))
+        with lock: #raise the alpha of the workers still searching
+            if value > agent.sharedAlpha.value: agent.sharedAlpha.value = value
+    except SearchTimeout:
+        value = None
+    counters = None #the worker's ordering lives on in this process : send back only this search's share
+    if before is not None: counters = tuple([now - then for now, then in zip(agent.ordering.counters(), before)])
+    return value, agent.nodes, agent.hitDepthLimit, counters
 
 class AlphaBetaAgent(MultiAgentSearchAgent):
     """
@@ -215,6 +534,34 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         Returns the minimax action using self.depth and self.evaluationFunction
         """
         "*** YOUR CODE HERE ***"
+        if self.timeLimit > 0: return self.deepeningAction(gameState, self.searchAction)
+        return self.searchAction(gameState)
+
+    def registerInitialState(self, gameState):
+        """
+        Called by the game before the first move : with workers set, starts
+        the worker processes of the parallel search once for the whole game
+        (where processes can be forked; elsewhere the search stays serial).
+        """
+        self.closePool()
+        if self.workers > 0 and 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            self.rootAlpha, self.rootAlphaLock = context.RawValue('d', -float("inf")), context.Lock()
+            self.pool = context.Pool(self.workers, _initRootSplitWorker, (self, self.rootAlpha, self.rootAlphaLock))
+
+    def closePool(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def final(self, state):
+        MultiAgentSearchAgent.final(self, state)
+        self.closePool()
+
+    def searchAction(self, gameState):
+        "The alpha-beta action of a search self.depth plies deep."
+        if self.pool is not None: return self.parallelSearchAction(gameState)
 
         #Similar to MiniMaxAgent, but we have alpha and beta 
         #Based on pseudocode in instruction pdf
@@ -225,53 +572,128 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         a = -float("inf") #alpha : initial value is -infinity (we keep increasing it)
         b = float("inf") #beta : initial value is infinity (we keep decreasing it)
         maxValue = -float("inf")
-
-        for actionIdx in range(len(legalMoves)):
-            successor = gameState.generateSuccessor(0, legalMoves[actionIdx])
-            value = self.value(successor, 1, 0, a, b)
-
-            if value > maxValue: #better value for action
+        h = self.rootHash(gameState)
+
+        #with move ordering the likely best move is searched first, but ties still go to the first legal move :
+        #a successor returns exactly a only if its value is exactly a (below a it returns less than a)
+        orderedMoves = self.orderedMoves(gameState, 0, 0, h)
+        if self.principalMove in orderedMoves: #iterative deepening : the previous iteration's best move first
+            orderedMoves = [self.principalMove] + [action for action in orderedMoves if action != self.principalMove]
+        for action in orderedMoves:
+            actionIdx = legalMoves.index(action)
+            successor = gameState.generateSuccessor(0, action)
+            value = self.value(successor, 1, 0, a, b, self.childHash(h, gameState, successor, 0))
+
+            if value > maxValue or (value == maxValue and actionIdx < targetIdx): #better value for action
                 targetIdx = actionIdx
                 maxValue = value
                 a = value #setting alpha : same as a = max(a, value) 
-                
+
+        if h is not None: self.table.store(h, 0, gameState.getScore(), self.depth, maxValue, TranspositionTable.EXACT, legalMoves[targetIdx])
         return legalMoves[targetIdx] #best action for pacman
 
-    def max_value(self, gameState, agentIndex, depth, a, b):
-        legalMoves = gameState.getLegalActions(agentIndex)
+    def parallelSearchAction(self, gameState):
+        """
+        The same action as searchAction, with every root move searched in a
+        worker process.  The workers share the alpha of the root, the best
+        value a finished root move has given so far, and read it at every
+        node, so they keep pruning as the others finish.
+
+        The action is the same one: the best root move comes back with its
+        exact value (no alpha it saw was above it), and every other move
+        with a value below that (exact, or an upper bound under some alpha
+        no higher than the best value), so the highest value, first legal
+        move on ties, is the serial search's choice.
+        """
+        legalMoves = gameState.getLegalActions(0)
+        orderedMoves = list(legalMoves)
+        if self.principalMove in orderedMoves: #started first, it gives the others a good alpha soonest
+            orderedMoves = [self.principalMove] + [action for action in orderedMoves if action != self.principalMove]
+
+        self.rootAlpha.value = -float("inf")
+        tasks = [(action, self.pool.apply_async(_searchRootMove, (gameState, action, self.depth, self.deadline))) for action in orderedMoves]
+        values, timedOut = {}, False
+        for action, task in tasks:
+            value, nodes, hitDepthLimit, counters = task.get()
+            self.nodes += nodes
+            if counters is not None: self.ordering.addCounters(counters) #the report counts the workers' searches
+            self.hitDepthLimit = self.hitDepthLimit or hitDepthLimit
+            if value is None: timedOut = True
+            values[action] = value
+        if timedOut: raise SearchTimeout()
+
+        targetIdx = 0
+        for actionIdx in range(len(legalMoves)):
+            if values[legalMoves[actionIdx]] > values[legalMoves[targetIdx]]: targetIdx = actionIdx
+        return legalMoves[targetIdx]
+
+    def max_value(self, gameState, agentIndex, depth, a, b, h=None):
+        legalMoves = self.orderedMoves(gameState, agentIndex, depth, h)
+        self.expandNode()
 
         value = -float("inf")
-        for action in legalMoves:
+        bestAction = None
+        for moveNumber, action in enumerate(legalMoves):
             successor = gameState.generateSuccessor(agentIndex, action)
 
-            value = max(value, self.value(successor, 1, depth, a, b))
-            if value > b: return value #beta pruning : if the value is bigger than beta, we don't have to traverse other successors
+            childValue = self.value(successor, 1, depth, a, b, self.childHash(h, gameState, successor, agentIndex))
+            if childValue > value: value, bestAction = childValue, action
+            if value > b: #beta pruning : if the value is bigger than beta, we don't have to traverse other successors
+                if self.ordering is not None: self.ordering.recordCutoff(action, (depth, agentIndex), self.moveContext(gameState, agentIndex), self.depth - depth, moveNumber)
+                return value, bestAction
             a = max(a, value) #setting alpha to the larger one
 
-        return value
+        return value, bestAction #the value and the move that gave it (for the move ordering)
 
-    def min_value(self, gameState, agentIndex, depth, a, b):
-        legalMoves = gameState.getLegalActions(agentIndex)
+    def min_value(self, gameState, agentIndex, depth, a, b, h=None):
+        legalMoves = self.orderedMoves(gameState, agentIndex, depth, h)
+        self.expandNode()
 
         value = float("inf")
-        for action in legalMoves:
+        bestAction = None
+        for moveNumber, action in enumerate(legalMoves):
             successor = gameState.generateSuccessor(agentIndex, action)
+            childHash = self.childHash(h, gameState, successor, agentIndex)
             if agentIndex == gameState.getNumAgents() - 1:
-                value = min(value, self.value(successor, 0, depth+1, a, b))
+                childValue = self.value(successor, 0, depth+1, a, b, childHash)
             else:
-                value = min(value, self.value(successor, agentIndex+1, depth, a, b)) 
-            if value < a: return value #alpha pruning : if the value is smaller than alpha, we don't have to traverse other successors
+                childValue = self.value(successor, agentIndex+1, depth, a, b, childHash)
+            if childValue < value: value, bestAction = childValue, action
+            if value < a: #alpha pruning : if the value is smaller than alpha, we don't have to traverse other successors
+                if self.ordering is not None: self.ordering.recordCutoff(action, (depth, agentIndex), self.moveContext(gameState, agentIndex), self.depth - depth, moveNumber)
+                return value, bestAction
             b = min(b, value) #setting beta to the smaller one
 
-        return value
+        return value, bestAction
 
-    def value(self, gameState, agentIndex, depth, a, b):
+    def value(self, gameState, agentIndex, depth, a, b, h=None):
         if self.depth == depth or gameState.isWin() or gameState.isLose():
+            if self.depth == depth: self.hitDepthLimit = True
             return self.evaluationFunction(gameState)
+        if self.sharedAlpha is not None: a = max(a, self.sharedAlpha.value) #another worker may have raised it
+        if h is not None:
+            entry = self.table.lookup(h, agentIndex, gameState.getScore(), self.depth - depth)
+            if entry is not None:
+                #a bound only answers for the node if it lies outside [a, b] on its side : then the node would be
+                #cut off the same way, otherwise we have to search it
+                tableValue, bound = entry
+                self.hitDepthLimit = True #for all we know the stored search was cut off at the depth limit
+                if bound == TranspositionTable.EXACT: return tableValue
+                if bound == TranspositionTable.LOWER and tableValue > b: return tableValue
+                if bound == TranspositionTable.UPPER and tableValue < a: return tableValue
         if agentIndex == 0: 
-            return self.max_value(gameState, agentIndex, depth, a, b)
+            value, bestAction = self.max_value(gameState, agentIndex, depth, a, b, h)
         else: 
-            return self.min_value(gameState, agentIndex, depth, a, b)
+            value, bestAction = self.min_value(gameState, agentIndex, depth, a, b, h)
+        if h is not None:
+            #we prune only on strict inequalities, so a value inside [a, b] (ends included) is exact
+            #(the shared alpha may have risen under the children, so the bound is taken against its latest value)
+            if self.sharedAlpha is not None: a = max(a, self.sharedAlpha.value)
+            if value > b: bound = TranspositionTable.LOWER
+            elif value < a: bound = TranspositionTable.UPPER
+            else: bound = TranspositionTable.EXACT
+            self.table.store(h, agentIndex, gameState.getScore(), self.depth - depth, value, bound, bestAction)
+        return value
 
     
 
@@ -288,7 +710,126 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         legal moves.
         """
         "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        if self.timeLimit > 0: return self.deepeningAction(gameState, self.searchAction)
+        return self.searchAction(gameState)
+
+    def searchAction(self, gameState):
+        "The expectimax action of a search self.depth plies deep."
+
+        #Similar to AlphaBetaAgent, but ghosts are chance nodes : the value of a ghost's turn is the average
+        #over its legal moves, so we cannot prune with alpha and beta alone (see chance_value for Star1)
+
+        legalMoves = gameState.getLegalActions(0) #legal actions that pacman can do
+
+        targetIdx = 0
+        a = -float("inf") #alpha and beta only matter with Star1 pruning
+        b = float("inf")
+        maxValue = -float("inf")
+        h = self.rootHash(gameState)
+
+        orderedMoves = self.orderedMoves(gameState, 0, 0, h)
+        if self.principalMove in orderedMoves: #iterative deepening : the previous iteration's best move first
+            orderedMoves = [self.principalMove] + [action for action in orderedMoves if action != self.principalMove]
+        for action in orderedMoves:
+            actionIdx = legalMoves.index(action)
+            successor = gameState.generateSuccessor(0, action)
+            value = self.value(successor, 1, 0, a, b, self.childHash(h, gameState, successor, 0))
+
+            if value > maxValue or (value == maxValue and actionIdx < targetIdx): #ties go to the first legal move
+                targetIdx = actionIdx
+                maxValue = value
+                a = value
+
+        if h is not None: self.table.store(h, 0, gameState.getScore(), self.depth, maxValue, TranspositionTable.EXACT, legalMoves[targetIdx])
+        return legalMoves[targetIdx] #best action for pacman
+
+    def max_value(self, gameState, agentIndex, depth, a, b, h=None):
+        legalMoves = self.orderedMoves(gameState, agentIndex, depth, h)
+        self.expandNode()
+
+        value = -float("inf")
+        bestAction = None
+        for action in legalMoves:
+            successor = gameState.generateSuccessor(agentIndex, action)
+            childValue = self.value(successor, 1, depth, a, b, self.childHash(h, gameState, successor, agentIndex)) #next agent is the first ghost
+            if childValue > value: value, bestAction = childValue, action
+            if value > b: return value, bestAction #only with Star1 : the chance node above is decided already
+            a = max(a, value)
+
+        return value, bestAction
+
+    def chance_value(self, gameState, agentIndex, depth, a, b, h=None):
+        """
+        The average value over the ghost's legal moves, all equally likely.
+
+        With Star1 pruning, the values of the moves not searched yet lie in
+        [lower, upper], the bounds of the evaluation below this node, so
+        after some of them the average is known to lie in [(sum + rest *
+        lower) / n, (sum + rest * upper) / n].  Once that is all below a or
+        all above b the node cannot matter and we return that bound.  Each
+        move is searched with the window that tells whether it gets there.
+
+        (Star2, which probes the moves of a MAX child for a lower bound,
+        only cuts against a finite beta, and with Pacman at the root beta
+        stays infinite : max nodes never lower it.)
+        """
+        legalMoves = self.orderedMoves(gameState, agentIndex, depth, h)
+        self.expandNode()
+
+        if agentIndex == gameState.getNumAgents() - 1: nextAgent, nextDepth = 0, depth + 1 #last ghost : pacman moves next, one ply deeper
+        else: nextAgent, nextDepth = agentIndex + 1, depth
+
+        n = len(legalMoves)
+        if self.evaluationBounds is not None:
+            lower, upper = self.evaluationBounds(gameState, self.depth - depth - 1) #pacman moves left below this node
+        else:
+            lower, upper = -float("inf"), float("inf")
+
+        values = {}
+        total = 0
+        for moveNumber, action in enumerate(legalMoves):
+            successor = gameState.generateSuccessor(agentIndex, action)
+            rest = n - moveNumber - 1 #moves left after this one
+            if self.evaluationBounds is None:
+                childValue = self.value(successor, nextAgent, nextDepth, -float("inf"), float("inf"), self.childHash(h, gameState, successor, agentIndex))
+            else:
+                childA = max(n * a - total - rest * upper, lower) #below this, the average is below a whatever the rest are
+                childB = min(n * b - total - rest * lower, upper) #above this, the average is above b
+                childValue = self.value(successor, nextAgent, nextDepth, childA, childB, self.childHash(h, gameState, successor, agentIndex))
+                if childValue < childA: #Star1 cutoff : the average is at most (total + childValue + rest * upper) / n < a
+                    if self.ordering is not None: self.ordering.recordCutoff(action, (depth, agentIndex), self.moveContext(gameState, agentIndex), self.depth - depth, moveNumber)
+                    return (total + childValue + rest * upper) / n, action
+                if childValue > childB: #the average is at least (total + childValue + rest * lower) / n > b
+                    if self.ordering is not None: self.ordering.recordCutoff(action, (depth, agentIndex), self.moveContext(gameState, agentIndex), self.depth - depth, moveNumber)
+                    return (total + childValue + rest * lower) / n, action
+            values[action] = childValue
+            total += childValue
+
+        #sum in the legal order, so the value does not depend on the search order to the last bit
+        return sum([values[action] for action in gameState.getLegalActions(agentIndex)]) / n, None
+
+    def value(self, gameState, agentIndex, depth, a, b, h=None):
+        if self.depth == depth or gameState.isWin() or gameState.isLose():
+            if self.depth == depth: self.hitDepthLimit = True
+            return self.evaluationFunction(gameState)
+        if h is not None: #a ghost's turn is cached like any other node
+            entry = self.table.lookup(h, agentIndex, gameState.getScore(), self.depth - depth)
+            if entry is not None:
+                tableValue, bound = entry
+                self.hitDepthLimit = True
+                if bound == TranspositionTable.EXACT: return tableValue
+                if bound == TranspositionTable.LOWER and tableValue > b: return tableValue
+                if bound == TranspositionTable.UPPER and tableValue < a: return tableValue
+        if agentIndex == 0: #MAX (pacman)
+            value, bestAction = self.max_value(gameState, agentIndex, depth, a, b, h)
+        else: #CHANCE (ghost)
+            value, bestAction = self.chance_value(gameState, agentIndex, depth, a, b, h)
+        if h is not None:
+            if value > b: bound = TranspositionTable.LOWER
+            elif value < a: bound = TranspositionTable.UPPER
+            else: bound = TranspositionTable.EXACT
+            self.table.store(h, agentIndex, gameState.getScore(), self.depth - depth, value, bound, bestAction)
+        return value
 
 def betterEvaluationFunction(currentGameState):
     """
@@ -302,3 +843,197 @@ def betterEvaluationFunction(currentGameState):
 
 # Abbreviation
 better = betterEvaluationFunction
+
+#evaluation function -> bounds(gameState, pacmanMoves) on its value below gameState, for Star1 pruning
+EVALUATION_BOUNDS = {scoreEvaluationFunction: scoreEvaluationBounds}
+
+class MCTSNode:
+    """
+    A node of MCTSAgent's search tree : gameState with agentIndex to move.
+    value is the sum of the returns (Pacman's evaluation at the end of the
+    rollout) of the visits through the node.
+    """
+
+    def __init__(self, gameState, agentIndex):
+        self.state = gameState
+        self.agentIndex = agentIndex
+        self.actions = gameState.getLegalActions(agentIndex) #empty at the end of the game
+        self.untried = list(self.actions) if agentIndex == 0 else None #pacman's moves with no child yet
+        self.children = {} #action -> MCTSNode
+        self.visits = 0
+        self.value = 0.0
+
+    def isTerminal(self):
+        return len(self.actions) == 0
+
+class MCTSAgent(MultiAgentSearchAgent):
+    """
+    Monte Carlo tree search (UCT) : instead of searching every move to a
+    fixed depth, it repeats iterations of
+      1. selection : from the root, Pacman picks the child with the best
+         upper confidence bound (mean return + exploration * sqrt(ln N / n)),
+         ghosts pick a legal move uniformly at random (as in expectimax),
+      2. expansion : the first move that has no node yet gets one,
+      3. rollout : the game is played on from the new node for rolloutDepth
+         Pacman moves, Pacman by the ReflexAgent features (rolloutAction),
+         ghosts at random, and the end scored with self.evaluationFunction,
+      4. backpropagation : every node on the path counts the visit and adds
+         the return,
+    and plays the root move visited most.  The subtree of the state the
+    game actually reached is kept for the next move.
+
+    -a iterations=N stops after N iterations per move, -a timeLimit=T after
+    T seconds (whichever comes first if both are given, 300 iterations if
+    neither is).  The root moves are each tried once however small the
+    budget.
+    """
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', iterations = '0', timeLimit = '0', exploration = '1.0', rolloutDepth = '10', **args):
+        MultiAgentSearchAgent.__init__(self, evalFn, timeLimit = timeLimit, **args)
+        self.iterationLimit = int(iterations)
+        if self.iterationLimit <= 0 and self.timeLimit <= 0: self.iterationLimit = 300
+        self.exploration = float(exploration)
+        self.rolloutDepth = int(rolloutDepth)
+        self.root = None #tree of the last move
+        self.lastAction = None
+        self.iterations, self.searchTime = 0, 0.0 #over the game, for the report
+        self.reusedVisits, self.totalVisits = 0, 0
+
+    def registerInitialState(self, gameState):
+        self.root = None
+
+    def getAction(self, gameState):
+        start = time.time()
+        root = self.reusedTree(gameState)
+        if root is None: root = MCTSNode(gameState, 0)
+        self.reusedVisits += root.visits
+        self.low, self.high = float("inf"), -float("inf") #range of the returns this move, to scale the mean returns to [0, 1]
+
+        iterations = 0
+        while len(root.untried) > 0 or not self.budgetSpent(iterations, start):
+            self.iterate(root)
+            iterations += 1
+
+        #the most visited move is the most robust one (ties go to the first legal move)
+        action = max(root.actions, key=lambda action: root.children[action].visits if action in root.children else -1)
+        self.iterations += iterations
+        self.searchTime += time.time() - start
+        self.totalVisits += root.visits
+        self.root, self.lastAction = root, action
+        return action
+
+    def budgetSpent(self, iterations, start):
+        if self.iterationLimit > 0 and iterations >= self.iterationLimit: return True
+        return self.timeLimit > 0 and time.time() - start >= self.timeLimit
+
+    def reusedTree(self, gameState):
+        "The node of the last move's tree for gameState (our last move, then the ghosts' replies), or None."
+        if self.root is None or self.lastAction not in self.root.children: return None
+        nodes = [self.root.children[self.lastAction]]
+        while len(nodes) > 0 and nodes[0].agentIndex != 0: #down the ghosts' turns to pacman's
+            nodes = [child for node in nodes for child in node.children.values()]
+        for node in nodes:
+            if node.state == gameState: return node
+        return None
+
+    def iterate(self, root):
+        "One iteration of selection, expansion, rollout and backpropagation from root."
+        node = root
+        path = [root]
+        while not node.isTerminal():
+            if node.agentIndex == 0 and len(node.untried) > 0:
+                node = self.expand(node, node.untried.pop(0))
+                path.append(node)
+                break
+            if node.agentIndex == 0: action = self.uctAction(node)
+            else: action = random.choice(node.actions) #ghosts move uniformly at random
+            if action not in node.children:
+                node = self.expand(node, action)
+                path.append(node)
+                break
+            node = node.children[action]
+            path.append(node)
+
+        value = self.rollout(node.state, node.agentIndex)
+        self.low, self.high = min(self.low, value), max(self.high, value)
+        for pathNode in path:
+            pathNode.visits += 1
+            pathNode.value += value
+
+    def expand(self, node, action):
+        successor = node.state.generateSuccessor(node.agentIndex, action)
+        child = MCTSNode(successor, (node.agentIndex + 1) % successor.getNumAgents())
+        node.children[action] = child
+        self.nodes += 1
+        return child
+
+    def uctAction(self, node):
+        "Pacman's move with the highest upper confidence bound (UCB1) ; every move has a child here."
+        scale = self.high - self.low if self.high > self.low else 1.0
+        logVisits = math.log(node.visits)
+        def bound(action):
+            child = node.children[action]
+            meanReturn = (child.value / child.visits - self.low) / scale
+            return meanReturn + self.exploration * math.sqrt(logVisits / child.visits)
+        return max(node.actions, key=bound)
+
+    def rollout(self, gameState, agentIndex):
+        "Plays on from gameState for rolloutDepth Pacman moves and returns the evaluation of the end."
+        pacmanMoves = 0
+        foodLeft = set(gameState.getFood().asList()) #kept up to date here rather than read off the grid every move
+        while not (gameState.isWin() or gameState.isLose()):
+            if agentIndex == 0:
+                if pacmanMoves == self.rolloutDepth: break
+                action = self.rolloutAction(gameState, foodLeft)
+                pacmanMoves += 1
+            else:
+                action = random.choice(gameState.getLegalActions(agentIndex))
+            gameState = gameState.generateSuccessor(agentIndex, action)
+            if agentIndex == 0: foodLeft.discard(gameState.getPacmanPosition())
+            agentIndex = (agentIndex + 1) % gameState.getNumAgents()
+        return self.evaluationFunction(gameState)
+
+    def rolloutAction(self, gameState, foodLeft):
+        """
+        Pacman's rollout move : the best by the features of
+        ReflexAgent.evaluationFunction (food on the new square, inverse
+        distance to the closest food, scared ghosts in reach, ghosts within
+        2 squares), ties and one move in ten at random.  The features are
+        taken from Pacman's new square without generating the successors,
+        which is most of the cost of the reflex agent, and the closest food
+        among the few that can be closest after one move.
+        """
+        legalMoves = gameState.getLegalActions(0)
+        if random.random() < 0.1: return random.choice(legalMoves) #keeps the rollouts from repeating the same line
+
+        x, y = gameState.getPacmanPosition()
+        foodDists = [(manhattanDistance((x, y), foodPos), foodPos) for foodPos in foodLeft]
+        closest = min(foodDists)[0]
+        nearFood = [foodPos for dist, foodPos in foodDists if dist <= closest + 1] #a move changes every distance by 1
+        ghostStates = gameState.getGhostStates()
+
+        scores = []
+        for action in legalMoves:
+            dx, dy = Actions.directionToVector(action)
+            newPos = (int(x + dx), int(y + dy))
+            score = 0.0
+            if newPos in foodLeft: score += 1 #the new square has food
+
+            minFoodDist = min([manhattanDistance(newPos, foodPos) for foodPos in nearFood])
+            if minFoodDist != 0: score += 1.0 / minFoodDist
+
+            for ghostState in ghostStates:
+                ghostDist = manhattanDistance(newPos, ghostState.getPosition())
+                if ghostDist <= ghostState.scaredTimer: score += ghostDist #we can eat the ghost
+                if ghostDist <= 2: score -= ghostDist #run away
+            scores.append(score)
+
+        bestScore = max(scores)
+        return random.choice([legalMoves[index] for index in range(len(scores)) if scores[index] == bestScore])
+
+    def final(self, state):
+        "Called by the game at its end : reports the iterations per second and the share of the tree reused."
+        MultiAgentSearchAgent.final(self, state)
+        rate = self.iterations / self.searchTime if self.searchTime > 0 else 0.0
+        reused = 100.0 * self.reusedVisits / self.totalVisits if self.totalVisits else 0.0
+        print('[MCTSAgent] %d iterations in %.1fs (%.0f per second), %.1f%% of the visits reused from the last move' % (self.iterations, self.searchTime, rate, reused))
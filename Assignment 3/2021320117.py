@@ -13,9 +13,11 @@
 
 from argparse import Action
 from game import Agent
+from game import Actions, Directions
 from searchProblems import PositionSearchProblem
 
 from util import Queue, PriorityQueue
+import heapq
 
 """
 IMPORTANT
@@ -175,40 +177,187 @@ class ClosestDotAgent(Agent):
         startPosition = gameState.getPacmanPosition(self.index)
         food = gameState.getFood()
         walls = gameState.getWalls()
-        problem = AnyFoodSearchProblem(gameState, self.index)
 
 
         "*** YOUR CODE HERE ***"
 
-        pacmanCurrent = [problem.getStartState(), [], 0]
-        visitedPosition = set()
-        # visitedPosition.add(problem.getStartState())
-        fringe = PriorityQueue()
-        fringe.push(pacmanCurrent, pacmanCurrent[2])
-        while not fringe.isEmpty():
-            pacmanCurrent = fringe.pop()
-            if pacmanCurrent[0] in visitedPosition:
-                continue
-            else:
-                visitedPosition.add(pacmanCurrent[0])
-            if problem.isGoalState(pacmanCurrent[0]):
-                return pacmanCurrent[1]
-            else:
-                pacmanSuccessors = problem.getSuccessors(pacmanCurrent[0])
-            Successor = []
-            for item in pacmanSuccessors:  # item: [(x,y), 'direction', cost]
-                if item[0] not in visitedPosition:
-                    pacmanRoute = pacmanCurrent[1].copy()
-                    pacmanRoute.append(item[1])
-                    sumCost = pacmanCurrent[2]
-                    Successor.append([item[0], pacmanRoute, sumCost + item[2]])
-            for item in Successor:
-                fringe.push(item, item[2])
-        return pacmanCurrent[1]
+        #the planner keeps its search between steps : each step only moves its start and
+        #drops the dots eaten since the last one (by any pacman), instead of searching again
+        planner = getattr(self, 'planner', None)
+        if planner is None or planner.walls is not walls: #first step of a game
+            planner = self.planner = DStarLitePlanner(walls, startPosition, food.asList())
+        return planner.replan(start=startPosition, goals=food.asList())
 
     def getAction(self, state):
         return self.findPathToClosestDot(state)[0]
 
+class DStarLitePlanner:
+    """
+    Incremental shortest paths (D* Lite) from a moving start to the nearest
+    of a changing set of goal cells, with step costs that can change
+    between calls.
+
+    The search runs backwards from the goals: g[cell] is the cost of the
+    cheapest way from cell to a goal and rhs[cell] its one-step lookahead,
+    and the cells where the two disagree wait in a priority queue.  When
+    cell costs change, goals are added or removed, or the start moves, only
+    the values those changes invalidate are repaired, so the work of the
+    next plan() grows with the size of the change rather than of the maze.
+    The heuristic is measured from the start, so moving the start only
+    raises the key modifier km instead of reordering the queue.
+
+    Stepping into a cell costs that cell's cost (1 unless changed, as in
+    PositionSearchProblem); a cost of None blocks the cell.  minCost must
+    stay a lower bound on every cost, as it scales the Manhattan heuristic.
+    """
+
+    def __init__(self, walls, start, goals, costs={}, minCost=1):
+        #open cells numbered column by column, with their neighbours in North, South, East, West order
+        self.cells = [(x, y) for x in range(walls.width) for y in range(walls.height) if not walls[x][y]]
+        self.cellIds = dict([(cell, i) for i, cell in enumerate(self.cells)])
+        self.size = len(self.cells)
+        self.offsets, self.neighborIds, self.actions = [0], [], []
+        for x, y in self.cells:
+            for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
+                dx, dy = Actions.directionToVector(action)
+                nextx, nexty = int(x + dx), int(y + dy)
+                if not walls[nextx][nexty]:
+                    self.neighborIds.append(self.cellIds[(nextx, nexty)])
+                    self.actions.append(action)
+            self.offsets.append(len(self.neighborIds))
+
+        inf = float("inf")
+        self.walls = walls
+        self.minCost = minCost
+        self.cost = [1] * self.size
+        for position, cost in costs.items():
+            self.cost[self.cellIds[position]] = inf if cost is None else cost
+        self.g = [inf] * self.size
+        self.rhs = [inf] * self.size
+        self.queue = [] # (key, cell) entries; an entry is stale once queued holds another key for its cell
+        self.queued = {} # cell -> its current key
+        self.km = 0
+        self.start = self.last = self.cellIds[start]
+        self.goals = set()
+        self.expanded = 0 # cells expanded by every plan() so far
+        self.setGoals(goals)
+
+    def neighbors(self, cell):
+        return self.neighborIds[self.offsets[cell]:self.offsets[cell+1]]
+
+    def heuristic(self, cell):
+        (x1, y1), (x2, y2) = self.cells[self.start], self.cells[cell]
+        return self.minCost * (abs(x1 - x2) + abs(y1 - y2))
+
+    def calculateKey(self, cell):
+        k2 = min(self.g[cell], self.rhs[cell])
+        return (k2 + self.heuristic(cell) + self.km, k2)
+
+    def lookahead(self, cell):
+        "Returns the cost of the cheapest step out of cell plus the cost to go after it."
+        if cell in self.goals: return 0
+        return min([self.cost[n] + self.g[n] for n in self.neighbors(cell)] + [float("inf")])
+
+    def updateVertex(self, cell):
+        if self.g[cell] != self.rhs[cell]:
+            key = self.calculateKey(cell)
+            if self.queued.get(cell) != key:
+                self.queued[cell] = key
+                heapq.heappush(self.queue, (key, cell))
+        elif cell in self.queued:
+            del self.queued[cell] #its heap entry goes stale
+
+    def setGoals(self, goals):
+        "Makes the positions in goals the goal cells; only the goals added or removed are repaired."
+        cellIds = self.cellIds
+        goals = set([cellIds[position] for position in goals])
+        for cell in self.goals - goals:
+            self.goals.discard(cell)
+            self.rhs[cell] = self.lookahead(cell)
+            self.updateVertex(cell)
+        for cell in goals - self.goals:
+            self.goals.add(cell)
+            self.rhs[cell] = 0
+            self.updateVertex(cell)
+
+    def moveStart(self, position):
+        "Moves the start to position."
+        cell = self.cellIds[position]
+        if cell == self.start: return
+        self.start = cell
+        self.km += self.heuristic(self.last) #every key in the queue is now this much too high
+        self.last = cell
+
+    def updateCells(self, costs):
+        "Changes the cost of stepping into cells; costs maps positions to their new cost (None blocks the cell)."
+        inf = float("inf")
+        g, rhs = self.g, self.rhs
+        for position, cost in costs.items():
+            v = self.cellIds[position]
+            old, new = self.cost[v], inf if cost is None else cost
+            assert new >= self.minCost, 'cell cost below minCost: ' + str(position)
+            if new == old: continue
+            self.cost[v] = new
+            for u in self.neighbors(v): #only the edges into v changed
+                if u in self.goals: continue
+                if new < old: rhs[u] = min(rhs[u], new + g[v])
+                elif rhs[u] == old + g[v]: rhs[u] = self.lookahead(u)
+                self.updateVertex(u)
+
+    def computeShortestPath(self):
+        inf = float("inf")
+        g, rhs, cost, queue, queued = self.g, self.rhs, self.cost, self.queue, self.queued
+        while queue:
+            key, u = queue[0]
+            if queued.get(u) != key:
+                heapq.heappop(queue)
+                continue
+            if key >= self.calculateKey(self.start) and g[self.start] == rhs[self.start]: break
+            heapq.heappop(queue)
+            newKey = self.calculateKey(u)
+            if key < newKey: #the start moved since u was queued
+                queued[u] = newKey
+                heapq.heappush(queue, (newKey, u))
+                continue
+            del queued[u]
+            self.expanded += 1
+            if g[u] > rhs[u]: #u got cheaper : its neighbours may now go through it
+                g[u] = rhs[u]
+                for s in self.neighbors(u):
+                    if s not in self.goals and cost[u] + g[u] < rhs[s]:
+                        rhs[s] = cost[u] + g[u]
+                        self.updateVertex(s)
+            else: #u got dearer : whoever went through it looks again
+                gOld, g[u] = g[u], inf
+                for s in list(self.neighbors(u)) + [u]:
+                    if s not in self.goals and (s == u or rhs[s] == cost[u] + gOld):
+                        rhs[s] = self.lookahead(s)
+                    self.updateVertex(s)
+
+    def plan(self):
+        """
+        Repairs the search after the changes made since the last call and
+        returns the actions of a cheapest path from the start to the nearest
+        goal, or [] if the start is a goal or no goal can be reached.
+        """
+        self.computeShortestPath()
+        g, cost, neighborIds = self.g, self.cost, self.neighborIds
+        cell, actions = self.start, []
+        if g[cell] == float("inf"): return actions
+        while cell not in self.goals and len(actions) < self.size:
+            best = min(range(self.offsets[cell], self.offsets[cell+1]),
+                       key=lambda edge: cost[neighborIds[edge]] + g[neighborIds[edge]])
+            actions.append(self.actions[best])
+            cell = neighborIds[best]
+        return actions
+
+    def replan(self, start=None, goals=None, costs=None):
+        "Applies whichever of a new start, goal positions and cell costs are given, then returns plan()."
+        if start is not None: self.moveStart(start)
+        if goals is not None: self.setGoals(goals)
+        if costs: self.updateCells(costs)
+        return self.plan()
+
 class AnyFoodSearchProblem(PositionSearchProblem):
     """
     A search problem for finding a path to any food.
@@ -14,6 +14,8 @@
 
 from captureAgents import CaptureAgent
 import random, util
+import os, hashlib, mmap, tempfile
+from array import array
 
 ################# 
 # Team creation #
@@ -38,6 +40,125 @@ def createTeam(firstIndex, secondIndex, isRed,
 
   return [eval(first)(firstIndex), eval(second)(secondIndex)]
 
+##################
+# Maze distances #
+##################
+
+MAZE_DISTANCE_CACHE = os.path.join(tempfile.gettempdir(), 'pacman-maze-distances')
+
+class MazeDistances:
+  """
+  Shortest maze distances between every pair of open cells of a layout.
+
+  One BFS per open cell fills a flat array of unsigned shorts indexed by
+  cellId1 * size + cellId2.  The array is saved in a file named after the
+  hash of the walls and memory-mapped, so both agents of the team and every
+  later game on the same layout answer getMazeDistance in O(1) without
+  searching again.
+  """
+  UNREACHABLE = 0xFFFF
+
+  def __init__(self, walls, cacheDir = MAZE_DISTANCE_CACHE):
+    self.cells = [(x, y) for x in range(walls.width) for y in range(walls.height) if not walls[x][y]]
+    self.cellIds = dict([(cell, i) for i, cell in enumerate(self.cells)])
+    self.size = len(self.cells)
+
+    layout = ''.join(['1' if walls[x][y] else '0' for x in range(walls.width) for y in range(walls.height)])
+    key = hashlib.sha1(('%d,%d:' % (walls.width, walls.height) + layout).encode()).hexdigest()
+    self.path = os.path.join(cacheDir, key + '.dist')
+
+    if not os.path.exists(self.path) or os.path.getsize(self.path) != 2 * self.size * self.size:
+      self.save(self.compute(walls))
+    with open(self.path, 'rb') as f:
+      self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    self.matrix = memoryview(self._map).cast('H')
+
+  def compute(self, walls):
+    neighbors = []
+    for x, y in self.cells:
+      neighbors.append([self.cellIds[(nx, ny)] for nx, ny in ((x, y+1), (x, y-1), (x+1, y), (x-1, y)) if not walls[nx][ny]])
+
+    size = self.size
+    matrix = array('H', [self.UNREACHABLE]) * (size * size)
+    for source in range(size): #BFS from every open cell
+      row = source * size
+      matrix[row + source] = 0
+      layer, depth = [source], 0
+      while layer:
+        depth += 1
+        nextLayer = []
+        for cell in layer:
+          for n in neighbors[cell]:
+            if matrix[row + n] == self.UNREACHABLE:
+              matrix[row + n] = depth
+              nextLayer.append(n)
+        layer = nextLayer
+    return matrix
+
+  def save(self, matrix):
+    if not os.path.isdir(os.path.dirname(self.path)): os.makedirs(os.path.dirname(self.path), exist_ok=True)
+    temp = '%s.%d.tmp' % (self.path, os.getpid())
+    with open(temp, 'wb') as f:
+      matrix.tofile(f)
+    os.replace(temp, self.path) #atomic : the other agent or game never reads a half-written file
+
+  def getDistance(self, pos1, pos2):
+    return self.matrix[self.cellIds[pos1] * self.size + self.cellIds[pos2]]
+
+mazeDistanceTables = {} #wall layout -> MazeDistances, shared by both agents of the team
+
+#################
+# Move ordering #
+#################
+
+class MoveOrdering:
+  """
+  Orders the moves of an alpha-beta node so that the ones likely to cause
+  a cutoff are searched first: the best move of a transposition table if
+  there is one, then the killer moves of the ply (the last two moves that
+  caused a cutoff at that depth and agent), then the rest by their history
+  score, the sum of depthLeft^2 over the cutoffs the move caused from the
+  same position.  Moves that tie keep the engine's order.
+
+  Alpha-beta returns the same values in any order, only faster in a good
+  one; a well ordered search makes most of its cutoffs on the first move.
+  """
+
+  def __init__(self):
+    self.killers = {} #ply -> up to two moves, most recent first
+    self.history = {} #(context, move) -> score
+    self.nodes, self.cutoffs, self.firstMoveCutoffs = 0, 0, 0
+
+  def newSearch(self):
+    #killers are about the position searched before, history only fades
+    self.killers = {}
+    for key in list(self.history.keys()):
+      self.history[key] //= 2
+      if self.history[key] == 0: del self.history[key]
+
+  def order(self, legalMoves, ply, context, tableMove = None):
+    self.nodes += 1
+    killers = self.killers.get(ply, [])
+    def rank(action):
+      if action == tableMove: return (0, 0)
+      if action in killers: return (1, killers.index(action))
+      return (2, -self.history.get((context, action), 0))
+    return sorted(legalMoves, key = rank)
+
+  def recordCutoff(self, action, ply, context, depthLeft, moveNumber):
+    #action, the moveNumber-th move tried (from 0), cut off the search of a node
+    self.cutoffs += 1
+    if moveNumber == 0: self.firstMoveCutoffs += 1
+    killers = self.killers.setdefault(ply, [])
+    if action not in killers:
+      killers.insert(0, action)
+      del killers[2:]
+    self.history[(context, action)] = self.history.get((context, action), 0) + depthLeft * depthLeft
+
+  def report(self):
+    first = 100.0 * self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+    return 'nodes %d, cutoffs %d (%.1f%% on the first move)' % (self.nodes, self.cutoffs, first)
+
 ##########
 # Agents #
 ##########
@@ -51,10 +172,20 @@ class CaptureMiniMaxAgent(CaptureAgent):
 
   def registerInitialState(self, gameState):
 
-    CaptureAgent.registerInitialState(self, gameState) 
+    #same as CaptureAgent.registerInitialState, but maze distances come from our cached table
+    #instead of the all-pairs computation of distanceCalculator
+    self.red = gameState.isOnRedTeam(self.index)
+    walls = gameState.getWalls()
+    if str(walls) not in mazeDistanceTables: mazeDistanceTables[str(walls)] = MazeDistances(walls)
+    self.mazeDistances = mazeDistanceTables[str(walls)]
+    import __main__
+    if '_display' in dir(__main__):
+      self.display = __main__._display
+
     self.start = gameState.getAgentPosition(self.index) #start position of agent
     self.depthLimit = 2 #depth limit for search tree
     self.agentList = [self.index] + self.getOpponents(gameState) #agent itself + 2 opponent agents
+    self.ordering = MoveOrdering() #killer moves and history : same values as the engine's order, fewer nodes
 
   def chooseAction(self, gameState):
       
@@ -74,6 +205,7 @@ class CaptureMiniMaxAgent(CaptureAgent):
 
     alpha = -float("inf")
     beta = float("inf")
+    self.ordering.newSearch()
 
     successorList = [gameState.generateSuccessor(self.index, action) for action in actionList]
     valueList = [self.value(successor, 0, 0, alpha, beta) for successor in successorList] 
@@ -98,13 +230,16 @@ class CaptureMiniMaxAgent(CaptureAgent):
 
         currAgentIdx = self.agentList[agentIndex]
         #print("max", currAgentIdx)
-        legalMoves = gameState.getLegalActions(currAgentIdx)
+        context = (currAgentIdx, gameState.getAgentPosition(currAgentIdx))
+        legalMoves = self.ordering.order(gameState.getLegalActions(currAgentIdx), (depth, agentIndex), context)
 
         value = -float("inf")
-        for action in legalMoves:
+        for moveNumber, action in enumerate(legalMoves):
             successor = gameState.generateSuccessor(currAgentIdx, action)
             value = max(value, self.value(successor, 1, depth, alpha, beta))
-            if value > beta: return value  #beta pruning
+            if value > beta: #beta pruning
+              self.ordering.recordCutoff(action, (depth, agentIndex), context, self.depthLimit - depth, moveNumber)
+              return value
             alpha = max(alpha, value)
 
         return value
@@ -113,20 +248,30 @@ class CaptureMiniMaxAgent(CaptureAgent):
 
       currAgentIdx = self.agentList[agentIndex]
       #print("min", currAgentIdx)
-      legalMoves = gameState.getLegalActions(currAgentIdx)
+      context = (currAgentIdx, gameState.getAgentPosition(currAgentIdx))
+      legalMoves = self.ordering.order(gameState.getLegalActions(currAgentIdx), (depth, agentIndex), context)
 
       value = float("inf")
-      for action in legalMoves:
+      for moveNumber, action in enumerate(legalMoves):
           successor = gameState.generateSuccessor(currAgentIdx, action)
           if agentIndex == len(self.agentList) - 1: #last agent
             value = min(value, self.value(successor, 0, depth+1, alpha, beta)) #go to the next depth
           else:
             value = min(value, self.value(successor, agentIndex+1, depth, alpha, beta)) #go to the next agent
-          if value < alpha: return value #alpha pruning
+          if value < alpha: #alpha pruning
+            self.ordering.recordCutoff(action, (depth, agentIndex), context, self.depthLimit - depth, moveNumber)
+            return value
           beta = min(beta, value) 
 
       return value
 
+  def getMazeDistance(self, pos1, pos2):
+    return self.mazeDistances.getDistance(pos1, pos2)
+
+  def final(self, gameState):
+    CaptureAgent.final(self, gameState)
+    print('[%s %d] move ordering: %s' % (type(self).__name__, self.index, self.ordering.report()))
+
   def getSuccessor(self, gameState, action):
 
     successor = gameState.generateSuccessor(self.index, action)